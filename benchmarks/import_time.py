@@ -0,0 +1,58 @@
+"""Measure the startup cost of the reorganizer CLI.
+
+Usage: python benchmarks/import_time.py [RUNS]
+
+Reports the median cumulative import time of `reorganizer.cli` (from
+`python -X importtime`), the median wall time of `--help`, and the
+slowest modules imported on the way. Compare against a checkout of the
+previous release, not an intermediate commit.
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+
+def run_python(*args):
+    env = dict(os.environ, PYTHONPATH=SRC_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True)
+
+
+def import_times():
+    """Return {module: (self_us, cumulative_us)} for one `import reorganizer.cli`."""
+    result = run_python('-X', 'importtime', '-c', 'import reorganizer.cli')
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        times[module.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    
+    samples = [import_times() for _ in range(runs)]
+    cumulative = statistics.median(sample['reorganizer.cli'][1] for sample in samples)
+    
+    help_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run_python('-m', 'reorganizer.cli', '--help')
+        help_times.append(time.perf_counter() - start)
+    
+    print(f"import reorganizer.cli: {cumulative / 1000:.1f} ms (median of {runs})")
+    print(f"reorganizer --help:     {statistics.median(help_times) * 1000:.1f} ms wall (median of {runs})")
+    print("\nSlowest imports (self time, last run):")
+    for module, (self_us, _) in sorted(samples[-1].items(), key=lambda item: -item[1][0])[:10]:
+        print(f"  {self_us / 1000:6.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
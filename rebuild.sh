@@ -1,7 +1,9 @@
 #!/usr/bin/bash
 
-uv run main.py collect xml ../preguntas/ -o ../blocks/full.xml
-
-uv run main.py collect xml ../preguntas/top/p1/p1a/ -o ../blocks/teoria.xml
-uv run main.py collect xml ../preguntas/top/p1/codigo -o ../blocks/codigo.xml
+# All jobs run in one process, paying interpreter startup only once.
+uv run main.py batch <<'JOBS'
+collect xml ../preguntas/ -o ../blocks/full.xml
 
+collect xml ../preguntas/top/p1/p1a/ -o ../blocks/teoria.xml
+collect xml ../preguntas/top/p1/codigo -o ../blocks/codigo.xml
+JOBS
@@ -8,7 +8,15 @@ and collecting questions from a directory structure to regenerate a monolithic f
 
 __version__ = "1.0.0"
 
-from .reorganizer import QuestionBackupReorganizer
-from .cli import main
-
 __all__ = ["QuestionBackupReorganizer", "main"]
+
+
+def __getattr__(name):
+    # Imported on first access so that `import reorganizer` stays cheap.
+    if name == "QuestionBackupReorganizer":
+        from .reorganizer import QuestionBackupReorganizer
+        return QuestionBackupReorganizer
+    if name == "main":
+        from .cli import main
+        return main
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,323 @@
+"""Streaming reader for the question bank inside Moodle course backups (.mbz)."""
+
+import json
+import os
+import re
+import tarfile
+import tempfile
+import xml.etree.ElementTree as ET
+
+
+NULL = '$@NULL@$'
+TEXT_FORMATS = {'0': 'moodle_auto_format', '1': 'html', '2': 'plain_text', '4': 'markdown'}
+CONTEXT_PREFIXES = {'10': '$system$', '40': '$coursecategory$', '50': '$course$', '70': '$module$'}
+
+# Option fields written as <field format="..."><text>...</text></field>
+TEXT_FIELDS = {'correctfeedback', 'partiallycorrectfeedback', 'incorrectfeedback', 'graderinfo', 'responsetemplate'}
+BOOLEAN_FIELDS = {'single', 'shuffleanswers'}
+FLAG_FIELDS = {'shownumcorrect'}
+SKIPPED_FIELDS = {'id', 'questionid', 'question', 'trueanswer', 'falseanswer', 'sequence'}
+SKIPPED_PLUGIN_ELEMENTS = {'answers', 'matches', 'numerical_records', 'numerical_units', 'numerical_options'}
+
+CLOZE_SPECIALS = re.compile(r'([\\}#~/"])')
+
+
+def _value(elem, path):
+    """Return the text at `path`, or None if missing or the backup NULL marker."""
+    value = elem.findtext(path)
+    return None if value is None or value == NULL else value
+
+
+def _add_text(parent, tag, text, text_format=None):
+    """Append <tag [format]><text>text</text></tag> to `parent`."""
+    elem = ET.SubElement(parent, tag)
+    if text_format is not None:
+        elem.set('format', TEXT_FORMATS.get(text_format, 'html'))
+    ET.SubElement(elem, 'text').text = text or ''
+    return elem
+
+
+def _percent(fraction):
+    """Convert a backup fraction (0.5000000) to a Moodle XML percentage (50)."""
+    return f"{float(fraction or 0) * 100:.7f}".rstrip('0').rstrip('.')
+
+
+class MoodleBackupReader:
+    """Streams the questions of a Moodle course backup as Moodle XML elements.
+    
+    The backup is read once, front to back, in tarfile's stream mode; only
+    the `questions.xml` entry is parsed and nothing is extracted to disk.
+    Categories become `$course$/top/...` paths as in a Moodle XML export,
+    Moodle 4 question bank entries contribute their latest version, and
+    cloze subquestions are folded back into their parent's text.
+    """
+    
+    CHUNK_SIZE = 1024 * 1024
+    QUESTIONS_ENTRY = 'questions.xml'
+    
+    def iter_questions(self, backup_file):
+        """Yield (category_path, name, <question> element) for every question in the backup.
+        
+        Raises OSError if the backup cannot be read or has no questions.xml
+        and ET.ParseError on malformed XML.
+        """
+        try:
+            with tarfile.open(backup_file, mode='r|*') as tar:
+                for member in tar:
+                    if member.isfile() and os.path.normpath(member.name) == self.QUESTIONS_ENTRY:
+                        yield from self._iter_bank(tar.extractfile(member))
+                        return
+        except tarfile.TarError as e:
+            raise OSError(f"not a readable Moodle backup: {e}") from e
+        raise OSError(f"backup contains no {self.QUESTIONS_ENTRY}")
+    
+    def _iter_bank(self, stream):
+        bank = _BankState(self)
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        stack = []
+        
+        for chunk in iter(lambda: stream.read(self.CHUNK_SIZE), b''):
+            parser.feed(chunk)
+            yield from self._handle_events(parser, stack, bank)
+        parser.close()
+        yield from self._handle_events(parser, stack, bank)
+        yield from bank.finish()
+    
+    def _handle_events(self, parser, stack, bank):
+        for event, elem in parser.read_events():
+            if event == 'start':
+                stack.append(elem)
+                continue
+            
+            stack.pop()
+            parent = stack[-1] if stack else None
+            if elem.tag == 'question' and parent is not None and parent.tag == 'questions':
+                category = next((e for e in reversed(stack) if e.tag == 'question_category'), None)
+                if category is not None:
+                    bank.register_category(category)
+                    versions = next((e for e in reversed(stack) if e.tag == 'question_versions'), None)
+                    if versions is None:
+                        yield from bank.add(category.get('id'), elem)
+                    else:
+                        bank.entry_versions.append((int(versions.findtext('version') or 0), category.get('id'), elem))
+                parent.remove(elem)
+            elif elem.tag == 'question_bank_entry':
+                if bank.entry_versions:
+                    _, category_id, question = max(bank.entry_versions, key=lambda version: version[0])
+                    yield from bank.add(category_id, question)
+                bank.entry_versions = []
+                parent.remove(elem)
+            elif elem.tag == 'question_category':
+                bank.register_category(elem)
+                if parent is not None:
+                    parent.remove(elem)
+    
+    def convert_question(self, question, qtype):
+        """Build the Moodle XML <question> for one backup <question> element."""
+        result = ET.Element('question', type=qtype)
+        _add_text(result, 'name', (_value(question, 'name') or '').strip())
+        _add_text(result, 'questiontext', _value(question, 'questiontext'), _value(question, 'questiontextformat'))
+        _add_text(result, 'generalfeedback', _value(question, 'generalfeedback'),
+                  _value(question, 'generalfeedbackformat'))
+        for source, target in (('defaultmark', 'defaultgrade'), ('penalty', 'penalty'),
+                               ('hidden', 'hidden'), ('idnumber', 'idnumber')):
+            value = _value(question, source)
+            if value is not None:
+                ET.SubElement(result, target).text = value
+        
+        plugin = question.find(f'plugin_qtype_{qtype}_question')
+        if plugin is not None:
+            options = self._options(plugin)
+            if options is not None:
+                self._add_options(result, options)
+            
+            true_answer = _value(options, 'trueanswer') if options is not None else None
+            tolerances = {record.findtext('answer'): record.findtext('tolerance')
+                          for record in plugin.iterfind('numerical_records/numerical_record')}
+            for answer in plugin.iterfind('answers/answer'):
+                elem = ET.SubElement(result, 'answer', fraction=_percent(_value(answer, 'fraction')),
+                                     format=TEXT_FORMATS.get(_value(answer, 'answerformat'), 'html'))
+                if qtype == 'truefalse':
+                    ET.SubElement(elem, 'text').text = 'true' if answer.get('id') == true_answer else 'false'
+                else:
+                    ET.SubElement(elem, 'text').text = _value(answer, 'answertext') or ''
+                if answer.get('id') in tolerances:
+                    ET.SubElement(elem, 'tolerance').text = tolerances[answer.get('id')]
+                _add_text(elem, 'feedback', _value(answer, 'feedback'), _value(answer, 'feedbackformat'))
+            
+            for match in plugin.iterfind('matches/match'):
+                subquestion = _add_text(result, 'subquestion', _value(match, 'questiontext'),
+                                        _value(match, 'questiontextformat'))
+                ET.SubElement(ET.SubElement(subquestion, 'answer'), 'text').text = _value(match, 'answertext') or ''
+        
+        for hint in question.iterfind('question_hints/question_hint'):
+            _add_text(result, 'hint', _value(hint, 'hint'), _value(hint, 'hintformat'))
+        return result
+    
+    def convert_cloze(self, question, subquestions):
+        """Build a cloze <question>, replacing {#N} markers with embedded answers."""
+        result = self.convert_question(question, 'cloze')
+        text = result.find('questiontext/text')
+        sequence = (_value(question, 'plugin_qtype_multianswer_question/multianswer/sequence') or '').split(',')
+        for index, subquestion_id in enumerate(sequence, 1):
+            if subquestion_id in subquestions:
+                embedded = self._embedded_answer(subquestions[subquestion_id])
+                if embedded:
+                    text.text = text.text.replace(f'{{#{index}}}', embedded)
+        return result
+    
+    def _embedded_answer(self, subquestion):
+        qtype = subquestion.findtext('qtype')
+        plugin = subquestion.find(f'plugin_qtype_{qtype}_question')
+        if plugin is None:
+            return None
+        options = self._options(plugin)
+        option = (lambda field: _value(options, field)) if options is not None else (lambda field: None)
+        
+        if qtype == 'shortanswer':
+            cloze_type = 'SHORTANSWER_C' if option('usecase') == '1' else 'SHORTANSWER'
+        elif qtype == 'numerical':
+            cloze_type = 'NUMERICAL'
+        elif qtype == 'multichoice':
+            if option('single') == '0':
+                cloze_type, variant = 'MULTIRESPONSE', 'H' if option('layout') == '2' else ''
+            else:
+                cloze_type, variant = 'MULTICHOICE', {'1': 'V', '2': 'H'}.get(option('layout'), '')
+            variant += 'S' if option('shuffleanswers') == '1' else ''
+            cloze_type += f'_{variant}' if variant else ''
+        else:
+            return None
+        
+        tolerances = {record.findtext('answer'): record.findtext('tolerance')
+                      for record in plugin.iterfind('numerical_records/numerical_record')}
+        answers = []
+        for answer in plugin.iterfind('answers/answer'):
+            part = f"%{_percent(_value(answer, 'fraction'))}%"
+            part += CLOZE_SPECIALS.sub(r'\\\1', _value(answer, 'answertext') or '')
+            if qtype == 'numerical' and tolerances.get(answer.get('id')):
+                part += f":{tolerances[answer.get('id')]}"
+            feedback = _value(answer, 'feedback')
+            if feedback:
+                part += '#' + CLOZE_SPECIALS.sub(r'\\\1', feedback)
+            answers.append(part)
+        
+        weight = round(float(_value(subquestion, 'defaultmark') or 1))
+        return f"{{{weight}:{cloze_type}:{'~'.join(answers)}}}"
+    
+    @staticmethod
+    def _options(plugin):
+        return next((child for child in plugin if child.tag not in SKIPPED_PLUGIN_ELEMENTS and len(child)), None)
+    
+    @staticmethod
+    def _add_options(result, options):
+        fields = {child.tag: child.text for child in options}
+        for field, value in fields.items():
+            if field in SKIPPED_FIELDS or value == NULL:
+                continue
+            if field in TEXT_FIELDS:
+                _add_text(result, field, value, fields.get(f'{field}format'))
+            elif field.endswith('format') and field[:-len('format')] in TEXT_FIELDS:
+                continue
+            elif field in BOOLEAN_FIELDS:
+                ET.SubElement(result, field).text = 'true' if value == '1' else 'false'
+            elif field in FLAG_FIELDS:
+                if value == '1':
+                    ET.SubElement(result, field)
+            else:
+                ET.SubElement(result, field).text = value
+
+
+class _BankState:
+    """Categories and questions of one backup that are still waiting on each other.
+    
+    Questions whose category path is not known yet (a parent category that
+    comes later in the file) are spooled to a temporary file, one JSON line
+    each, so that memory does not grow with the size of the bank.
+    """
+    
+    def __init__(self, reader):
+        self.reader = reader
+        self.categories = {}
+        self.entry_versions = []
+        self.subquestions = {}
+        self.cloze = {}
+        self.deferred = None
+    
+    def register_category(self, category):
+        """Remember id -> (name, parent id, context) of a <question_category>."""
+        category_id = category.get('id')
+        if category_id not in self.categories and category.find('name') is not None:
+            self.categories[category_id] = (
+                _value(category, 'name') or '',
+                _value(category, 'parent') or '0',
+                CONTEXT_PREFIXES.get(_value(category, 'contextlevel'), '$course$'),
+            )
+    
+    def add(self, category_id, question):
+        """Queue one backup question; yield every question that became complete."""
+        qtype = question.findtext('qtype')
+        parent = _value(question, 'parent')
+        if parent and parent != '0':
+            self.subquestions[question.get('id')] = question
+            if parent in self.cloze:
+                yield from self._emit_cloze(parent, complete_only=True)
+        elif qtype == 'multianswer':
+            self.cloze[question.get('id')] = (category_id, question)
+            yield from self._emit_cloze(question.get('id'), complete_only=True)
+        elif qtype != 'random':
+            yield from self._emit(category_id, self.reader.convert_question(question, qtype))
+    
+    def finish(self):
+        """Yield questions still waiting for subquestions or parent categories."""
+        for question_id in list(self.cloze):
+            yield from self._emit_cloze(question_id, complete_only=False)
+        if self.deferred is None:
+            return
+        
+        with self.deferred:
+            self.deferred.seek(0)
+            for line in self.deferred:
+                record = json.loads(line)
+                question = ET.fromstring(record['question'])
+                yield (self.category_path(record['category'], allow_missing=True),
+                       question.findtext('name/text'), question)
+        self.deferred = None
+    
+    def category_path(self, category_id, allow_missing=False):
+        """Return the category path of `category_id`, or None if a parent is not known yet."""
+        names = []
+        seen = set()
+        current = category_id
+        while current not in ('0', None) and current not in seen:
+            seen.add(current)
+            if current not in self.categories:
+                if not allow_missing:
+                    return None
+                break
+            name, current, _ = self.categories[current]
+            names.append(name.replace('/', '//'))
+        context = self.categories.get(category_id, ('', '0', '$course$'))[2]
+        return '/'.join([context] + names[::-1])
+    
+    def _emit(self, category_id, question):
+        name = question.findtext('name/text')
+        if not name:
+            return
+        category_path = self.category_path(category_id)
+        if category_path is None:
+            if self.deferred is None:
+                self.deferred = tempfile.TemporaryFile('w+', encoding='utf-8')
+            self.deferred.write(json.dumps({'category': category_id,
+                                            'question': ET.tostring(question, encoding='unicode')}) + '\n')
+        else:
+            yield category_path, name, question
+    
+    def _emit_cloze(self, question_id, complete_only):
+        category_id, question = self.cloze[question_id]
+        sequence = (_value(question, 'plugin_qtype_multianswer_question/multianswer/sequence') or '').split(',')
+        if complete_only and not all(item in self.subquestions for item in sequence if item):
+            return
+        del self.cloze[question_id]
+        yield from self._emit(category_id, self.reader.convert_cloze(question, self.subquestions))
+        for item in sequence:
+            self.subquestions.pop(item, None)
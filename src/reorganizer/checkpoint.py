@@ -0,0 +1,158 @@
+"""Checkpoint journal used to resume interrupted export and collect runs."""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+
+EXPORT_JOURNAL = '.reorganizer-journal'
+COLLECT_JOURNAL_SUFFIX = '.journal'
+
+
+class CheckpointJournal:
+    """Append-only JSON-lines journal of completed work.
+    
+    The first line identifies the run (operation, format, input and its
+    size/mtime); every following line records one completed unit of work.
+    
+    Records are written in groups of GROUP_SIZE units (or every
+    GROUP_SECONDS): the outputs of the group are forced to disk first, then
+    the records and the journal itself, so an interrupted run redoes at
+    most one group and a truncated last line simply means that unit has to
+    be redone.
+    """
+    
+    GROUP_SIZE = 64
+    GROUP_SECONDS = 1.0
+    
+    def __init__(self, path, file_handler):
+        self.path = path
+        self.file_handler = file_handler
+        self._out = None
+        self._pending = []
+        self._group_started = None
+    
+    @staticmethod
+    def describe_input(path):
+        """Return the identity of an input file or directory for the journal header."""
+        info = os.stat(path)
+        return {'input': os.path.abspath(path), 'size': info.st_size, 'mtime_ns': info.st_mtime_ns}
+    
+    @classmethod
+    def open(cls, path, file_handler, header, resume=False):
+        """Start or resume the journal at `path`; return (journal, records).
+        
+        `records` is None when an existing journal cannot be resumed.
+        """
+        journal = cls(path, file_handler)
+        if resume:
+            return journal, journal.resume(header)
+        
+        if journal.exists():
+            print("  Note: discarding checkpoint of an interrupted run (use --resume to continue it)")
+        journal.start(header)
+        return journal, []
+    
+    @staticmethod
+    def describe_listing(fmt, output_file, entries, max_size, max_questions, markdown=None):
+        """Return the journal header of a collect run over (rel_path, ...) entries.
+        
+        With a `markdown` converter its version is recorded, so a run cannot
+        be resumed with Markdown conversion switched on or off.
+        """
+        listing = hashlib.sha256('\n'.join(entry[0] for entry in entries).encode('utf-8')).hexdigest()
+        return {'operation': 'collect', 'format': fmt, 'output': os.path.abspath(output_file),
+                'listing': listing, 'max_size': max_size, 'max_questions': max_questions,
+                'markdown': markdown.VERSION if markdown is not None else None}
+    
+    def exists(self):
+        """Return True if an unfinished run left a journal behind."""
+        return os.path.exists(self.path)
+    
+    def start(self, header):
+        """Begin a fresh journal, discarding any previous one."""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        self._out = open(self.path, 'w', encoding='utf-8')
+        self._out.write(json.dumps(header, ensure_ascii=False) + '\n')
+        self.file_handler.sync(self._out)
+        self.file_handler.defer_syncs()
+    
+    def resume(self, header):
+        """Reopen the journal and return its completed records.
+        
+        A missing journal starts a fresh one and returns []. Returns None
+        if the journal was written for a different run.
+        """
+        if not self.exists():
+            print("  No checkpoint journal found, starting from the beginning.")
+            self.start(header)
+            return []
+        
+        records = []
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().split('\n')
+        
+        try:
+            saved_header = json.loads(lines[0])
+        except ValueError:
+            saved_header = None
+        if saved_header != header:
+            print(f"Error: Checkpoint journal {self.path} belongs to a different run "
+                  f"(input changed?). Run without --resume to start over.", file=sys.stderr)
+            return None
+        
+        valid_lines = [lines[0]]
+        for line in lines[1:]:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid_lines.append(line)
+        
+        with self.file_handler.atomic_open(self.path) as f:
+            f.write('\n'.join(valid_lines) + '\n')
+        self._out = open(self.path, 'a', encoding='utf-8')
+        self.file_handler.defer_syncs()
+        
+        print(f"  Resuming from checkpoint: {len(records)} completed entries")
+        return records
+    
+    def record(self, entry):
+        """Add one completed unit of work; it becomes durable with its group."""
+        if not self._pending:
+            self._group_started = time.monotonic()
+        self._pending.append(entry)
+        if (len(self._pending) >= self.GROUP_SIZE
+                or time.monotonic() - self._group_started >= self.GROUP_SECONDS):
+            self.flush()
+    
+    def flush(self):
+        """Force the outputs of pending records to disk, then append the records."""
+        self.file_handler.sync_deferred()
+        if self._pending:
+            self._out.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n' for entry in self._pending))
+            self._pending = []
+            self.file_handler.sync(self._out)
+    
+    def finish(self):
+        """Close and delete the journal after a successful run."""
+        self._pending = []
+        self.file_handler.sync_deferred(stop=True)
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+    
+    def close(self):
+        """Close the journal, keeping it on disk for a later --resume."""
+        if self._out is not None:
+            try:
+                self.flush()
+            except OSError:
+                pass
+            self._out.close()
+            self._out = None
+        self.file_handler.sync_deferred(stop=True)
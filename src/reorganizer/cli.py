@@ -1,12 +1,43 @@
 """Command-line interface for the question backup reorganizer."""
 
+import os
 import sys
+import glob
+import shlex
 import argparse
 from .reorganizer import QuestionBackupReorganizer
 
 
-def main():
-    """Main entry point for the CLI."""
+def parse_size(value):
+    """Parse a byte size such as 500000, 512K, 10M or 1G."""
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = value.strip().upper().removesuffix('B')
+    multiplier = 1
+    if text and text[-1] in units:
+        multiplier = units[text[-1]]
+        text = text[:-1]
+    try:
+        size = int(float(text) * multiplier)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid size: '{value}'")
+    if size <= 0:
+        raise argparse.ArgumentTypeError(f"size must be positive: '{value}'")
+    return size
+
+
+def positive_int(value):
+    """Parse a strictly positive integer argument."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid number: '{value}'")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"number must be positive: '{value}'")
+    return number
+
+
+def build_parser():
+    """Build the argument parser for all subcommands."""
     parser = argparse.ArgumentParser(
         description='Backup and reorganization of question banks in GIFT or Moodle XML format',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -24,38 +55,244 @@ Usage examples:
 
   # Collect Moodle XML from directories
   %(prog)s collect xml xml_backup -o questions_recompiled.xml
+
+  # Export many course exports into one shared tree using 4 processes
+  %(prog)s export xml 'courses/*.xml' -o xml_backup -j 4
+
+  # Collect into shards of at most 10 MB (questions_001.xml, questions_002.xml, ...)
+  %(prog)s collect xml xml_backup -o questions.xml --max-size 10M
+
+  # Show added/removed/moved/modified questions between two snapshots
+  %(prog)s diff xml old.xml new.xml --export-changes changed
+
+  # Continue an export that was interrupted
+  %(prog)s export xml questions.xml -o xml_backup --resume
+
+  # Daily incremental backup, then rebuild an old bank from the store
+  %(prog)s snapshot xml questions.xml -s backups
+  %(prog)s history -s backups
+  %(prog)s collect xml --snapshot 20250101-120000 -s backups -o old.xml
+
+  # Convert Markdown question text to HTML while collecting, with 8 processes
+  %(prog)s collect gift gift_backup -o full.gift --markdown -j 8
+
+  # Check a tree (or only the files staged for commit) before importing
+  %(prog)s lint xml xml_backup
+
+  # Run many export/collect jobs in one process (one command per line)
+  %(prog)s batch jobs.txt
         """
     )
     
+    parser.add_argument('--fsync', choices=['always', 'never'], default='always',
+                        help='Force every written file to disk before renaming it into place (default: always)')
+    
     subparsers = parser.add_subparsers(dest='action', help='Action to perform', required=True)
     
     # Subcommand: export
     export_parser = subparsers.add_parser('export', help='Export questions to directory structure')
     export_parser.add_argument('format', choices=['gift', 'xml'], help='Input file format')
-    export_parser.add_argument('input', help='Input file (GIFT or XML)')
+    export_parser.add_argument('input', nargs='+', help='Input files or glob patterns (GIFT, XML or Moodle .mbz backup)')
     export_parser.add_argument('-o', '--output', default='backup', help='Output directory (default: backup)')
+    export_parser.add_argument('-j', '--jobs', type=positive_int, metavar='N',
+                               help='Worker processes for multiple inputs (default: CPU count)')
+    export_parser.add_argument('--resume', action='store_true',
+                               help='Continue an interrupted export from its checkpoint journal')
     
     # Subcommand: collect
     collect_parser = subparsers.add_parser('collect', help='Collect questions from directory structure')
     collect_parser.add_argument('format', choices=['gift', 'xml'], help='Output file format')
-    collect_parser.add_argument('input', help='Input directory with file structure')
+    collect_parser.add_argument('input', nargs='?', help='Input directory with file structure')
     collect_parser.add_argument('-o', '--output', help='Output file', required=True)
+    collect_parser.add_argument('--max-size', type=parse_size, metavar='SIZE',
+                                help='Split output into numbered shards of at most SIZE bytes (e.g. 512K, 10M)')
+    collect_parser.add_argument('--max-questions', type=positive_int, metavar='N',
+                                help='Split output into numbered shards of at most N questions')
+    collect_parser.add_argument('--snapshot', metavar='NAME', help='Collect snapshot NAME instead of a directory')
+    collect_parser.add_argument('-s', '--store', help='Snapshot store directory (with --snapshot)')
+    collect_parser.add_argument('--resume', action='store_true',
+                                help='Continue an interrupted collection from its checkpoint journal')
+    collect_parser.add_argument('--markdown', action='store_true',
+                                help='Convert Markdown question text (code, bold, italic) to HTML')
+    collect_parser.add_argument('--markdown-cache', metavar='FILE',
+                                help='Conversion cache reused across runs (default: ~/.cache/reorganizer/markdown.json)')
+    collect_parser.add_argument('-j', '--jobs', type=positive_int, metavar='N',
+                                help='Worker processes reading and converting files (default: 1)')
+    
+    # Subcommand: diff
+    diff_parser = subparsers.add_parser('diff', help='Compare two monolithic banks question by question')
+    diff_parser.add_argument('format', choices=['gift', 'xml'], help='Format of both files')
+    diff_parser.add_argument('old', help='Old bank file')
+    diff_parser.add_argument('new', help='New bank file')
+    diff_parser.add_argument('--export-changes', metavar='DIR',
+                             help='Export added, moved and modified questions of the new bank to DIR')
+    
+    # Subcommand: snapshot
+    snapshot_parser = subparsers.add_parser('snapshot', help='Store a bank as an incremental, deduplicated snapshot')
+    snapshot_parser.add_argument('format', choices=['gift', 'xml'], help='Input file format')
+    snapshot_parser.add_argument('input', help='Input file (GIFT or XML)')
+    snapshot_parser.add_argument('-s', '--store', required=True, help='Snapshot store directory')
+    snapshot_parser.add_argument('--name', help='Snapshot name (default: current timestamp)')
+    
+    # Subcommand: history
+    history_parser = subparsers.add_parser('history', help='List the snapshots in a store')
+    history_parser.add_argument('-s', '--store', required=True, help='Snapshot store directory')
+    
+    # Subcommand: restore
+    restore_parser = subparsers.add_parser('restore', help='Rebuild the directory structure of a snapshot')
+    restore_parser.add_argument('snapshot', help='Snapshot name')
+    restore_parser.add_argument('-s', '--store', required=True, help='Snapshot store directory')
+    restore_parser.add_argument('-o', '--output', required=True, help='Output directory')
+    
+    # Subcommand: lint
+    lint_parser = subparsers.add_parser('lint', help='Check monolithic files or exported trees for import errors')
+    lint_parser.add_argument('format', choices=['gift', 'xml'], help='Format of the files')
+    lint_parser.add_argument('paths', nargs='+', help='Files or directories to check')
+    lint_parser.add_argument('-j', '--jobs', type=positive_int, metavar='N',
+                             help='Worker processes for many files (default: CPU count)')
     
-    args = parser.parse_args()
+    # Subcommand: batch
+    batch_parser = subparsers.add_parser('batch', help='Run export and collect jobs from a file in one process')
+    batch_parser.add_argument('jobs_file', nargs='?', default='-',
+                              help='File with one export/collect command per line (default: stdin)')
     
-    reorganizer = QuestionBackupReorganizer()
+    return parser
+
+
+def run_command(parser, args, reorganizer):
+    """Validate and run one parsed export/collect/... command; return True on success."""
+    if args.action == 'collect':
+        if args.snapshot and not args.store:
+            parser.error('--snapshot requires --store')
+        if bool(args.snapshot) == bool(args.input):
+            parser.error('collect needs either an input directory or --snapshot')
+    
+    if args.action == 'collect' and args.markdown and not args.markdown_cache:
+        from .markdown_to_html import default_cache_file
+        args.markdown_cache = default_cache_file()
+    
+    if args.action == 'export':
+        single_input = len(args.input) == 1 and (os.path.exists(args.input[0]) or not glob.has_magic(args.input[0]))
+        if args.resume and not single_input:
+            parser.error('--resume is only supported with a single input file')
     
     if args.action == 'export':
         if args.format == 'gift':
-            success = reorganizer.export_gift_to_structure(args.input, args.output)
+            if single_input:
+                success = reorganizer.export_gift_to_structure(args.input[0], args.output, args.resume)
+            else:
+                success = reorganizer.export_gift_files_to_structure(args.input, args.output, args.jobs)
         else:  # xml
-            success = reorganizer.export_xml_to_structure(args.input, args.output)
+            if single_input:
+                success = reorganizer.export_xml_to_structure(args.input[0], args.output, args.resume)
+            else:
+                success = reorganizer.export_xml_files_to_structure(args.input, args.output, args.jobs)
+    
+    elif args.action == 'collect' and args.snapshot:
+        if args.format == 'gift':
+            success = reorganizer.collect_gift_from_snapshot(
+                args.store, args.snapshot, args.output, args.max_size, args.max_questions, args.resume,
+                args.markdown, args.markdown_cache, args.jobs)
+        else:  # xml
+            success = reorganizer.collect_xml_from_snapshot(
+                args.store, args.snapshot, args.output, args.max_size, args.max_questions, args.resume,
+                args.markdown, args.markdown_cache, args.jobs)
     
     elif args.action == 'collect':
         if args.format == 'gift':
-            success = reorganizer.collect_gift_from_structure(args.input, args.output)
+            success = reorganizer.collect_gift_from_structure(
+                args.input, args.output, args.max_size, args.max_questions, args.resume,
+                args.markdown, args.markdown_cache, args.jobs)
+        else:  # xml
+            success = reorganizer.collect_xml_from_structure(
+                args.input, args.output, args.max_size, args.max_questions, args.resume,
+                args.markdown, args.markdown_cache, args.jobs)
+    
+    elif args.action == 'diff':
+        if args.format == 'gift':
+            success = reorganizer.diff_gift_banks(args.old, args.new, args.export_changes)
+        else:  # xml
+            success = reorganizer.diff_xml_banks(args.old, args.new, args.export_changes)
+    
+    elif args.action == 'lint':
+        if args.format == 'gift':
+            success = reorganizer.lint_gift(args.paths, args.jobs)
+        else:  # xml
+            success = reorganizer.lint_xml(args.paths, args.jobs)
+    
+    elif args.action == 'snapshot':
+        if args.format == 'gift':
+            success = reorganizer.snapshot_gift(args.input, args.store, args.name)
         else:  # xml
-            success = reorganizer.collect_xml_from_structure(args.input, args.output)
+            success = reorganizer.snapshot_xml(args.input, args.store, args.name)
+    
+    elif args.action == 'history':
+        success = reorganizer.snapshot_history(args.store)
+    
+    elif args.action == 'restore':
+        success = reorganizer.restore_snapshot(args.store, args.snapshot, args.output)
+    
+    return success
+
+
+def run_batch(parser, jobs_file, reorganizer):
+    """Run the export/collect jobs listed in `jobs_file` ('-' for stdin) with one reorganizer.
+    
+    Each non-empty line is a command as it would follow `reorganizer`;
+    `#` starts a comment. Failed jobs do not stop the batch.
+    """
+    try:
+        if jobs_file == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            with open(jobs_file, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+    except OSError as e:
+        print(f"Error: Could not read jobs file {jobs_file}: {e}", file=sys.stderr)
+        return False
+    
+    jobs = []
+    for line_number, line in enumerate(lines, 1):
+        try:
+            argv = shlex.split(line, comments=True)
+        except ValueError as e:
+            print(f"Error: {jobs_file}:{line_number}: {e}", file=sys.stderr)
+            return False
+        if not argv:
+            continue
+        if argv[0] not in ('export', 'collect'):
+            print(f"Error: {jobs_file}:{line_number}: only export and collect jobs are supported", file=sys.stderr)
+            return False
+        jobs.append(argv)
+    
+    failed = 0
+    for index, argv in enumerate(jobs, 1):
+        print(f"\n[{index}/{len(jobs)}] {shlex.join(argv)}")
+        try:
+            success = run_command(parser, parser.parse_args(argv), reorganizer)
+        except SystemExit:
+            # argparse already printed the usage error
+            success = False
+        if not success:
+            failed += 1
+    
+    if failed:
+        print(f"\n✗ Batch completed: {failed} of {len(jobs)} jobs failed", file=sys.stderr)
+        return False
+    print(f"\n✓ Batch completed: {len(jobs)} jobs")
+    return True
+
+
+def main(argv=None):
+    """Main entry point for the CLI."""
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    reorganizer = QuestionBackupReorganizer(fsync=args.fsync == 'always')
+    
+    if args.action == 'batch':
+        success = run_batch(parser, args.jobs_file, reorganizer)
+    else:
+        success = run_command(parser, args, reorganizer)
     
     sys.exit(0 if success else 1)
 
@@ -0,0 +1,49 @@
+"""Ordered, optionally parallel rendering of question files for collect."""
+
+from .markdown_to_html import MarkdownConverter
+from .workers import get_processor
+
+
+# Files handed to a worker at a time; keeps IPC overhead low on large trees.
+CHUNK_SIZE = 64
+
+_worker_converter = None
+
+
+def _render_entry(fmt, filepath, source_label, use_markdown, markdown_cache, fsync):
+    """Render one file in a worker; return (chunks, new Markdown cache entries)."""
+    global _worker_converter
+    processor = get_processor(fmt, fsync)
+    if not use_markdown:
+        return processor.render_collect_entry(filepath, source_label), {}
+    
+    if _worker_converter is None:
+        _worker_converter = MarkdownConverter(markdown_cache, processor.file_handler)
+    chunks = processor.render_collect_entry(filepath, source_label, _worker_converter)
+    return chunks, _worker_converter.take_new_entries()
+
+
+def iter_rendered_entries(processor, entries, markdown=None, jobs=None):
+    """Yield (rel_path, chunks) for (rel_path, filepath, source_label) entries, in order.
+    
+    With `jobs` > 1 files are read, cleaned and converted by worker
+    processes; conversions they make are merged into `markdown` so the
+    parent saves them to the shared cache.
+    """
+    if not jobs or jobs == 1:
+        for rel_path, filepath, source_label in entries:
+            yield rel_path, processor.render_collect_entry(filepath, source_label, markdown)
+        return
+    
+    from concurrent.futures import ProcessPoolExecutor
+    count = len(entries)
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = pool.map(_render_entry, [processor.EXTENSION] * count,
+                           [entry[1] for entry in entries], [entry[2] for entry in entries],
+                           [markdown is not None] * count,
+                           [markdown.cache_file if markdown is not None else None] * count,
+                           [processor.file_handler.fsync] * count, chunksize=CHUNK_SIZE)
+        for (rel_path, _, _), (chunks, new_entries) in zip(entries, results):
+            if markdown is not None:
+                markdown.merge(new_entries)
+            yield rel_path, chunks
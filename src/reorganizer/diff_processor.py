@@ -0,0 +1,156 @@
+"""Semantic comparison of two question bank snapshots."""
+
+import os
+import sys
+import xml.etree.ElementTree as ET
+
+from .file_utils import FilenameRegistry, READ_ERRORS
+
+
+class BankDiffer:
+    """Compares two monolithic banks through a hashed question index.
+    
+    Each bank is streamed once and reduced to a map of (category, name) to
+    normalized content hashes, so memory grows with the number of questions
+    rather than with their content.
+    """
+    
+    def __init__(self, gift_processor, xml_processor):
+        self.processors = {'gift': gift_processor, 'xml': xml_processor}
+    
+    def iter_keyed_questions(self, processor, input_file):
+        """Stream (key, payload) pairs, numbering repeated category/name pairs."""
+        seen = {}
+        for category_path, name, payload in processor.iter_questions(input_file):
+            category = category_path.replace(os.sep, '/')
+            occurrence = seen.get((category, name), 0)
+            seen[(category, name)] = occurrence + 1
+            yield (category, name, occurrence), category_path, name, payload
+    
+    def build_index(self, processor, input_file):
+        """Return {(category, name): [content hash, ...]} for every question in a bank."""
+        index = {}
+        for (category, name, _), _, _, payload in self.iter_keyed_questions(processor, input_file):
+            index.setdefault((category, name), []).append(processor.question_hash(payload))
+        return index
+    
+    def compare(self, old_index, new_index):
+        """Classify questions into added, removed, moved and modified keys.
+        
+        Within a category/name group, questions are first paired by content
+        hash; leftovers are paired by position as modifications. Added and
+        removed questions sharing name and content are reported as moved.
+        """
+        added, removed, modified = [], [], []
+        
+        for group in sorted(old_index.keys() | new_index.keys()):
+            old_hashes = old_index.get(group, [])
+            new_hashes = new_index.get(group, [])
+            
+            unmatched_new = self._unmatched(new_hashes, old_hashes)
+            unmatched_old = self._unmatched(old_hashes, new_hashes)
+            
+            pairs = min(len(unmatched_old), len(unmatched_new))
+            modified.extend(group + (occurrence,) for occurrence in unmatched_new[:pairs])
+            added.extend(group + (occurrence,) for occurrence in unmatched_new[pairs:])
+            removed.extend(group + (occurrence,) for occurrence in unmatched_old[pairs:])
+        
+        removed_by_content = {}
+        for key in removed:
+            content = (key[1], old_index[key[:2]][key[2]])
+            removed_by_content.setdefault(content, []).append(key)
+        
+        moved = []
+        still_added = []
+        for key in added:
+            candidates = removed_by_content.get((key[1], new_index[key[:2]][key[2]]))
+            if candidates:
+                moved.append((candidates.pop(0), key))
+            else:
+                still_added.append(key)
+        
+        moved_from = {old_key for old_key, _ in moved}
+        still_removed = [key for key in removed if key not in moved_from]
+        
+        return still_added, still_removed, moved, modified
+    
+    @staticmethod
+    def _unmatched(hashes, other_hashes):
+        """Return the occurrences in `hashes` with no equal-content partner in `other_hashes`."""
+        available = {}
+        for content_hash in other_hashes:
+            available[content_hash] = available.get(content_hash, 0) + 1
+        
+        unmatched = []
+        for occurrence, content_hash in enumerate(hashes):
+            if available.get(content_hash):
+                available[content_hash] -= 1
+            else:
+                unmatched.append(occurrence)
+        return unmatched
+    
+    def diff(self, fmt, old_file, new_file, export_dir=None):
+        """Print the semantic differences between two banks of the same format."""
+        processor = self.processors[fmt]
+        print(f"Comparing {fmt.upper()} banks:")
+        print(f"  Old: {old_file}")
+        print(f"  New: {new_file}")
+        
+        try:
+            old_index = self.build_index(processor, old_file)
+            new_index = self.build_index(processor, new_file)
+        except ET.ParseError as e:
+            print(f"Error: Could not parse XML: {e}", file=sys.stderr)
+            return False
+        except READ_ERRORS as e:
+            print(f"Error: Could not read bank: {e}", file=sys.stderr)
+            return False
+        
+        added, removed, moved, modified = self.compare(old_index, new_index)
+        
+        for key in added:
+            print(f"  + {self._label(key)}")
+        for key in removed:
+            print(f"  - {self._label(key)}")
+        for old_key, new_key in moved:
+            print(f"  > {self._label(old_key)} -> {self._label(new_key)}")
+        for key in modified:
+            print(f"  ~ {self._label(key)}")
+        
+        total = sum(len(hashes) for hashes in new_index.values())
+        unchanged = total - len(added) - len(moved) - len(modified)
+        print(f"\n✓ Diff completed: {len(added)} added, {len(removed)} removed, "
+              f"{len(moved)} moved, {len(modified)} modified, {unchanged} unchanged")
+        
+        if export_dir:
+            changed = set(added) | set(modified) | {new_key for _, new_key in moved}
+            return self.export_changes(processor, new_file, export_dir, changed)
+        return True
+    
+    def export_changes(self, processor, input_file, base_output_dir, changed_keys):
+        """Export only the questions of `input_file` whose keys are in `changed_keys`."""
+        print(f"Exporting changed questions to: {base_output_dir}")
+        question_count = 0
+        filename_registry = FilenameRegistry()
+        
+        try:
+            for key, category_path, name, payload in self.iter_keyed_questions(processor, input_file):
+                if key not in changed_keys:
+                    continue
+                output_filepath = processor.write_question(base_output_dir, category_path, name,
+                                                           payload, filename_registry)
+                if output_filepath:
+                    print(f"  Created: {os.path.relpath(output_filepath, base_output_dir)}")
+                    question_count += 1
+        except (ET.ParseError,) + READ_ERRORS as e:
+            print(f"Error: Could not export changes: {e}", file=sys.stderr)
+            return False
+        
+        print(f"\n✓ Export completed: {question_count} changed questions")
+        return True
+    
+    @staticmethod
+    def _label(key):
+        category, name, occurrence = key
+        label = f"{category}/{name}" if category else name
+        return f"{label} [{occurrence + 1}]" if occurrence else label
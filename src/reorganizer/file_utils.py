@@ -1,11 +1,63 @@
 """File handling utilities for safe reading and writing."""
 
+import bz2
+import gzip
+import lzma
+import os
 import re
 import sys
+from contextlib import contextmanager
+
+
+COMPRESSION_OPENERS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', gzip.open),
+    (b'\xfd7zXZ\x00', lzma.open),
+    (b'BZh', bz2.open),
+)
+
+# Errors reading a (possibly compressed) input; EOFError and LZMAError are
+# raised by the stdlib codecs on truncated or corrupt streams.
+READ_ERRORS = (OSError, UnicodeDecodeError, EOFError, lzma.LZMAError)
+
+
+class InputError(Exception):
+    """Wraps an error raised while reading an input, see `guard_input`."""
+    
+    def __init__(self, error):
+        super().__init__(str(error))
+        self.error = error
+
+
+def guard_input(iterable, errors=READ_ERRORS):
+    """Yield from `iterable`, re-raising `errors` as InputError.
+    
+    Lets a caller that also writes files tell a failing input apart from
+    a failing output, as both raise OSError.
+    """
+    try:
+        yield from iterable
+    except errors as e:
+        raise InputError(e) from e
 
 
 class FileHandler:
-    """Handles safe file operations preserving escape sequences."""
+    """Handles safe file operations preserving escape sequences.
+    
+    Every write goes to `<path>.partial` first and is renamed over the
+    final path once complete, so an interrupted run never leaves a
+    half-written file behind. With `fsync` enabled, data and the rename
+    are flushed to disk before the write is reported as done; journaled
+    runs batch the directory syncs per group (see `defer_syncs`).
+    """
+    
+    PARTIAL_SUFFIX = '.partial'
+    
+    def __init__(self, fsync=True):
+        self.fsync = fsync
+        self._deferred_files = None
+        self._deferred_dirs = None
     
     @staticmethod
     def sanitize_filename(title):
@@ -23,9 +75,57 @@ class FileHandler:
         safe_name = re.sub(r'[ ]+', '_', safe_name)
         return safe_name.strip('_')
     
+    @staticmethod
+    def compression_opener(filepath):
+        """Return gzip/bz2/lzma `open` for a compressed file (by its magic bytes), or None."""
+        with open(filepath, 'rb') as f:
+            head = f.read(6)
+        for magic, opener in COMPRESSION_MAGIC:
+            if head.startswith(magic):
+                if opener is bz2.open and not head[3:4].isdigit():
+                    continue
+                return opener
+        return None
+    
+    @staticmethod
+    def is_compressed(filepath):
+        """Return True if `filepath` will be written compressed (by its extension)."""
+        return os.path.splitext(filepath)[1].lower() in COMPRESSION_OPENERS
+    
+    @staticmethod
+    def split_compression_suffix(filepath):
+        """Split 'bank.xml.gz' into ('bank.xml', '.gz'); plain paths get ''."""
+        stem, ext = os.path.splitext(filepath)
+        if ext.lower() in COMPRESSION_OPENERS:
+            return stem, ext
+        return filepath, ''
+    
+    @staticmethod
+    def open_binary(filepath, detect_compression=True):
+        """Open a file for binary streaming reads, decompressing it transparently.
+        
+        Tree files are never compressed; pass detect_compression=False to skip sniffing them.
+        """
+        opener = FileHandler.compression_opener(filepath) if detect_compression else None
+        if opener is not None:
+            return opener(filepath, 'rb')
+        return open(filepath, 'rb')
+    
+    @staticmethod
+    def open_preserving_escapes(filepath, detect_compression=True):
+        """Open a text file for streaming reads without newline translation.
+        
+        gzip, bz2 and xz files are decompressed on the fly unless
+        detect_compression is False.
+        """
+        opener = FileHandler.compression_opener(filepath) if detect_compression else None
+        if opener is not None:
+            return opener(filepath, 'rt', encoding='utf-8', newline='')
+        return open(filepath, 'r', encoding='utf-8', newline='')
+    
     @staticmethod
     def safe_read_preserving_escapes(filepath):
-        """Read a file preserving all escape sequences."""
+        """Read a tree file preserving all escape sequences."""
         try:
             with open(filepath, 'r', encoding='utf-8', newline='') as f:
                 return f.read()
@@ -33,13 +133,135 @@ class FileHandler:
             print(f"  Error reading {filepath}: {e}", file=sys.stderr)
             return None
     
-    @staticmethod
-    def safe_write_preserving_escapes(filepath, content):
+    def safe_write_preserving_escapes(self, filepath, content):
         """Write content preserving escape sequences."""
         try:
-            with open(filepath, 'w', encoding='utf-8', newline='') as f:
+            with self.atomic_open(filepath, newline='') as f:
                 f.write(content)
             return True
         except Exception as e:
             print(f"  Error writing {filepath}: {e}", file=sys.stderr)
             return False
+    
+    def open_partial(self, filepath, binary=False, newline=None, resume_offset=None):
+        """Open the temporary file for `filepath`.
+        
+        Paths ending in .gz, .bz2 or .xz are compressed while writing. With
+        `resume_offset` an existing partial file is reopened and
+        truncated to that offset instead of being recreated.
+        """
+        partial = filepath + self.PARTIAL_SUFFIX
+        encoding = None if binary else 'utf-8'
+        if self.is_compressed(filepath):
+            if resume_offset is not None:
+                raise OSError(f"cannot resume compressed output {filepath}")
+            opener = COMPRESSION_OPENERS[os.path.splitext(filepath)[1].lower()]
+            return opener(partial, 'wb' if binary else 'wt', encoding=encoding, newline=newline)
+        
+        if resume_offset is None:
+            return open(partial, 'wb' if binary else 'w', encoding=encoding, newline=newline)
+        
+        f = open(partial, 'r+b' if binary else 'r+', encoding=encoding, newline=newline)
+        f.seek(resume_offset)
+        f.truncate()
+        return f
+    
+    def commit_partial(self, f, filepath):
+        """Close a file from `open_partial` and atomically move it to `filepath`."""
+        self.sync(f)
+        f.close()
+        os.replace(filepath + self.PARTIAL_SUFFIX, filepath)
+        if self._deferred_dirs is not None:
+            self._deferred_dirs.add(os.path.dirname(filepath))
+        elif self.fsync:
+            self.sync_directory(os.path.dirname(filepath))
+    
+    def discard_partial(self, f, filepath):
+        """Close a file from `open_partial` and remove it."""
+        f.close()
+        try:
+            os.remove(filepath + self.PARTIAL_SUFFIX)
+        except OSError:
+            pass
+    
+    @contextmanager
+    def atomic_open(self, filepath, binary=False, newline=None):
+        """Context manager writing `filepath` atomically through a partial file."""
+        f = self.open_partial(filepath, binary, newline)
+        try:
+            yield f
+        except BaseException:
+            self.discard_partial(f, filepath)
+            raise
+        self.commit_partial(f, filepath)
+    
+    def sync(self, f, deferred=False):
+        """Flush `f` and, if the fsync policy says so, force it to disk.
+        
+        With `deferred`, inside `defer_syncs` the fsync waits for the next
+        `sync_deferred`.
+        """
+        f.flush()
+        if deferred and self._deferred_files is not None:
+            if f not in self._deferred_files:
+                self._deferred_files.append(f)
+        elif self.fsync:
+            os.fsync(f.fileno())
+    
+    def defer_syncs(self):
+        """Batch directory syncs and deferred file syncs until `sync_deferred`.
+        
+        Journaled runs use this to make a group of units durable with one
+        round of fsyncs instead of several per unit.
+        """
+        if self._deferred_dirs is None:
+            self._deferred_files = []
+            self._deferred_dirs = set()
+    
+    def sync_deferred(self, stop=False):
+        """Force everything batched since the last call to disk; `stop` ends batching."""
+        files, dirs = self._deferred_files or [], self._deferred_dirs or set()
+        if stop:
+            self._deferred_files = self._deferred_dirs = None
+        elif self._deferred_dirs is not None:
+            self._deferred_files, self._deferred_dirs = [], set()
+        if not self.fsync:
+            return
+        for f in files:
+            if not f.closed:
+                os.fsync(f.fileno())
+        for dirpath in sorted(dirs):
+            self.sync_directory(dirpath)
+    
+    def sync_directory(self, dirpath):
+        """Persist renames inside `dirpath` (no-op where unsupported)."""
+        try:
+            fd = os.open(dirpath or '.', os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+class FilenameRegistry:
+    """Allocates unique filenames per output directory with numeric suffixes."""
+    
+    def __init__(self):
+        self.used_filenames = {}
+    
+    def allocate(self, output_dir, base_filename, extension):
+        """Return a filename for `base_filename` that is unused in `output_dir`."""
+        if output_dir not in self.used_filenames:
+            self.used_filenames[output_dir] = {}
+        
+        used = self.used_filenames[output_dir]
+        if base_filename in used:
+            used[base_filename] += 1
+            return f"{base_filename}_{used[base_filename]}.{extension}"
+        
+        used[base_filename] = 0
+        return f"{base_filename}.{extension}"
@@ -1,35 +1,49 @@
 """GIFT format processor for export and collect operations."""
 
+import hashlib
 import os
 import re
 import sys
 
+from .checkpoint import CheckpointJournal, COLLECT_JOURNAL_SUFFIX, EXPORT_JOURNAL
+from .collect_pool import iter_rendered_entries
+from .file_utils import FilenameRegistry, InputError, guard_input
+from .shard_utils import ShardWriter
+
 
 class GIFTProcessor:
     """Handles GIFT format export and collection."""
     
+    EXTENSION = 'gift'
+    QUESTION_MARKER = re.compile(r'// .*\.gift\n')
+    ANSWER_START = re.compile(r'(?<!\\)\{')
+    FORMAT_MARKER = re.compile(r'\[(html|markdown|plain|moodle)\]')
+    
     def __init__(self, text_processor, file_handler):
         self.text_processor = text_processor
         self.file_handler = file_handler
     
-    def export_to_structure(self, input_file, base_output_dir):
-        """Export GIFT questions from monolithic file to directory structure."""
-        print(f"Exporting GIFT from: {input_file}")
-        print(f"Output directory: {base_output_dir}")
-        
-        content = self.file_handler.safe_read_preserving_escapes(input_file)
-        if content is None:
-            print(f"Error: Could not read file '{input_file}'.", file=sys.stderr)
-            return False
-        
-        content = '\n' + content
-        blocks = re.split(r'(?=\n^// .*\.gift\n)', content, flags=re.MULTILINE)
+    def iter_blocks(self, input_file):
+        """Stream the raw blocks of a monolithic GIFT file.
         
+        A block starts at every `// <path>.gift` comment line written by
+        collect. Raises OSError if the file cannot be read.
+        """
+        block = []
+        with self.file_handler.open_preserving_escapes(input_file) as f:
+            for line in f:
+                if block and block[-1].endswith('\n') and self.QUESTION_MARKER.fullmatch(line):
+                    yield ''.join(block)
+                    block = []
+                block.append(line)
+        if block:
+            yield ''.join(block)
+    
+    def iter_questions(self, input_file):
+        """Stream (category_path, title, formatted block) for every titled question."""
         current_category = ''
-        question_count = 0
-        used_filenames = {}
         
-        for block in blocks:
+        for block in self.iter_blocks(input_file):
             original_block = block.strip()
             if not original_block:
                 continue
@@ -61,27 +75,100 @@ class GIFTProcessor:
             
             final_category_path = category_path_from_title if category_path_from_title else current_category
             
-            base_filename = self.file_handler.sanitize_filename(actual_title)
-            output_dir = os.path.join(base_output_dir, final_category_path) if final_category_path else base_output_dir
-            os.makedirs(output_dir, exist_ok=True)
-            
-            if output_dir not in used_filenames:
-                used_filenames[output_dir] = {}
-            
-            if base_filename in used_filenames[output_dir]:
-                used_filenames[output_dir][base_filename] += 1
-                filename = f"{base_filename}_{used_filenames[output_dir][base_filename]}.gift"
-            else:
-                used_filenames[output_dir][base_filename] = 0
-                filename = f"{base_filename}.gift"
-            
-            output_filepath = os.path.join(output_dir, filename)
+            yield final_category_path, actual_title, formatted_block
+    
+    @staticmethod
+    def _report_read_error(input_file, error):
+        print(f"  Error reading {input_file}: {error}", file=sys.stderr)
+        print(f"Error: Could not read file '{input_file}'.", file=sys.stderr)
+    
+    def question_path(self, base_output_dir, category_path, title, filename_registry):
+        """Allocate the output path of one question."""
+        base_filename = self.file_handler.sanitize_filename(title)
+        output_dir = os.path.join(base_output_dir, category_path) if category_path else base_output_dir
+        filename = filename_registry.allocate(output_dir, base_filename, self.EXTENSION)
+        return os.path.join(output_dir, filename)
+    
+    def write_question(self, base_output_dir, category_path, title, formatted_block, filename_registry):
+        """Write one question as a standalone GIFT file; return its path or None on error."""
+        output_filepath = self.question_path(base_output_dir, category_path, title, filename_registry)
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+        
+        if self.file_handler.safe_write_preserving_escapes(output_filepath, self.render_question(formatted_block)):
+            return output_filepath
+        return None
+    
+    def render_question(self, formatted_block):
+        """Return the contents of the standalone file for one question."""
+        return formatted_block
+    
+    def question_hash(self, formatted_block):
+        """Hash a question independently of comments, categories and fullwidth rewrites."""
+        lines = [line for line in formatted_block.splitlines()
+                 if not line.startswith('//') and not line.startswith('$CATEGORY:')]
+        normalized = self.text_processor.normalize_for_comparison('\n'.join(lines))
+        return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+    
+    def export_to_structure(self, input_file, base_output_dir, resume=False):
+        """Export GIFT questions from monolithic file to directory structure.
+        
+        Completed questions are recorded in a checkpoint journal inside
+        `base_output_dir`; with `resume` an interrupted export continues
+        after the last recorded question.
+        """
+        print(f"Exporting GIFT from: {input_file}")
+        print(f"Output directory: {base_output_dir}")
+        
+        question_count = 0
+        skipped_count = 0
+        filename_registry = FilenameRegistry()
+        journal = None
+        
+        try:
+            header = {'operation': 'export', 'format': self.EXTENSION, **CheckpointJournal.describe_input(input_file)}
+        except OSError as e:
+            self._report_read_error(input_file, e)
+            return False
+        
+        try:
+            journal, records = CheckpointJournal.open(
+                os.path.join(base_output_dir, EXPORT_JOURNAL), self.file_handler, header, resume)
+            if records is None:
+                return False
+            completed = {record['index'] for record in records}
             
-            if self.file_handler.safe_write_preserving_escapes(output_filepath, formatted_block):
-                print(f"  Created: {os.path.relpath(output_filepath, base_output_dir)}")
-                question_count += 1
+            questions = guard_input(self.iter_questions(input_file))
+            for index, (category_path, title, formatted_block) in enumerate(questions):
+                if index in completed:
+                    self.question_path(base_output_dir, category_path, title, filename_registry)
+                    skipped_count += 1
+                    continue
+                
+                output_filepath = self.write_question(base_output_dir, category_path, title,
+                                                      formatted_block, filename_registry)
+                if output_filepath:
+                    rel_path = os.path.relpath(output_filepath, base_output_dir)
+                    journal.record({'index': index, 'path': rel_path})
+                    print(f"  Created: {rel_path}")
+                    question_count += 1
+        except InputError as e:
+            journal.close()
+            self._report_read_error(input_file, e.error)
+            if question_count:
+                print(f"Note: {question_count} questions read before the error were kept in '{base_output_dir}'.",
+                      file=sys.stderr)
+            return False
+        except OSError as e:
+            if journal is not None:
+                journal.close()
+            print(f"Error: Could not write to output directory '{base_output_dir}': {e}", file=sys.stderr)
+            return False
         
-        print(f"\n✓ Export completed: {question_count} questions")
+        journal.finish()
+        if skipped_count:
+            print(f"\n✓ Export completed: {question_count} questions ({skipped_count} already done)")
+        else:
+            print(f"\n✓ Export completed: {question_count} questions")
         return True
     
     def _format_gift_block(self, block):
@@ -106,13 +193,15 @@ class GIFTProcessor:
                 return block + '\n'
             
             stem_part = block[title_end_idx + 2 : brace_start_idx]
-            answer_part = block[brace_start_idx + 1 : brace_end_idx]
+            answer_part = block[brace_start_idx + 1 : brace_end_idx].strip()
+            # An empty line would end the question (e.g. essays, `{}`)
+            answer_lines = f"{answer_part}\n" if answer_part else ""
             
             return (
                 f"{title_part.strip()}\n"
                 f"{stem_part.strip()}\n"
                 f"{{\n"
-                f"{answer_part.strip()}\n"
+                f"{answer_lines}"
                 f"}}\n"
             )
         except (ValueError, IndexError):
@@ -140,14 +229,60 @@ class GIFTProcessor:
             # Also check for multiple brace pairs
             if content.count('{') > 1:
                 return True
-                
+        
         except (ValueError, IndexError):
             pass
         
         return False
     
-    def collect_from_structure(self, base_input_dir, output_file):
-        """Collect GIFT questions from directory structure into monolithic file."""
+    def render_collect_entry(self, filepath, source_label, markdown=None):
+        """Return the output chunks of one collected file, or None if it cannot be read."""
+        content = self.file_handler.safe_read_preserving_escapes(filepath)
+        if content is None:
+            return None
+        
+        content = self.text_processor.protect_backslashes_in_code(content)
+#        content = self.text_processor.apply_forward_substitutions(content) # FIXME: la substitución se hace fuera de las guardas de código "`" y "```"
+        if markdown is not None:
+            content = self.convert_markdown(content, markdown)
+        return [f"// {source_label}\n{content.strip()}\n\n"]
+    
+    def convert_markdown(self, content, markdown):
+        """Convert the Markdown stem of one GIFT question to HTML.
+        
+        Cloze questions and stems with a non-Markdown format marker are left
+        untouched. Blank lines would end the question, so they are written
+        as `&nbsp;` lines.
+        """
+        title_match = re.search(r'::.*?::', content, re.DOTALL)
+        if not title_match:
+            return content
+        brace_match = self.ANSWER_START.search(content, title_match.end())
+        if not brace_match or self._is_cloze_question(content[title_match.end():]):
+            return content
+        
+        stem = content[title_match.end():brace_match.start()].strip()
+        format_match = self.FORMAT_MARKER.match(stem)
+        if format_match:
+            if format_match.group(1) != 'markdown':
+                return content
+            stem = stem[format_match.end():].strip()
+        
+        converted = markdown.convert(stem)
+        if converted is None:
+            return content
+        converted = re.sub(r'\n(?=\n)', '\n&nbsp;', converted)
+        return f"{content[:title_match.end()]}\n[html]{converted}\n{content[brace_match.start():]}"
+    
+    def collect_from_structure(self, base_input_dir, output_file, max_size=None, max_questions=None, resume=False,
+                               markdown=None, jobs=None):
+        """Collect GIFT questions from directory structure into monolithic file.
+        
+        With `max_size` (bytes) or `max_questions` the output is split into
+        numbered shards, each starting with its own $CATEGORY marker. With a
+        `markdown` converter, Markdown question text is converted to HTML;
+        `jobs` > 1 reads and converts files in worker processes.
+        """
         print(f"Collecting GIFT from: {base_input_dir}")
         print(f"Output file: {output_file}")
         
@@ -169,34 +304,75 @@ class GIFTProcessor:
         
         gift_files.sort()
         
+        return self.collect_files([(rel_path, filepath, filepath) for rel_path, filepath in gift_files],
+                                  output_file, max_size, max_questions, resume, markdown, jobs)
+    
+    def collect_files(self, gift_files, output_file, max_size=None, max_questions=None, resume=False,
+                      markdown=None, jobs=None):
+        """Write (rel_path, filepath, source_label) entries, sorted by rel_path, to `output_file`.
+        
+        The category of each question comes from the directory of its
+        rel_path; source_label is written in the `//` marker line. Progress
+        is journaled next to the output; with `resume` an interrupted
+        collection continues after the last recorded file.
+        """
+        journal = None
+        
+        if resume and self.file_handler.is_compressed(output_file):
+            print(f"Error: --resume is not supported for compressed output '{output_file}'.", file=sys.stderr)
+            return False
+        
         try:
-            with open(output_file, 'w', encoding='utf-8') as out:
+            journal, records = CheckpointJournal.open(
+                output_file + COLLECT_JOURNAL_SUFFIX, self.file_handler,
+                CheckpointJournal.describe_listing(self.EXTENSION, output_file, gift_files, max_size, max_questions,
+                                                   markdown),
+                resume)
+            if records is None:
+                return False
+            completed = {record['file'] for record in records}
+            
+            with ShardWriter(self.file_handler, output_file, max_size=max_size, max_questions=max_questions) as out:
                 current_category = None
                 question_count = 0
                 
-                for rel_path, filepath in gift_files:
+                if records:
+                    out.restore(records[-1]['writer'])
+                    current_category = os.path.dirname(records[-1]['file'])
+                    question_count = records[-1]['questions']
+                
+                pending = [entry for entry in gift_files if entry[0] not in completed]
+                for rel_path, chunks in iter_rendered_entries(self, pending, markdown, jobs):
                     dir_path = os.path.dirname(rel_path)
                     
                     if dir_path != current_category:
                         current_category = dir_path
                         if dir_path:
                             category_path = '/' + dir_path.replace(os.sep, '/')
-                            out.write(f"\n$CATEGORY: $course${category_path}\n\n")
+                            out.set_category(f"\n$CATEGORY: $course${category_path}\n\n")
                         else:
-                            out.write(f"\n$CATEGORY: $course$\n\n")
+                            out.set_category(f"\n$CATEGORY: $course$\n\n")
                     
-                    content = self.file_handler.safe_read_preserving_escapes(filepath)
-                    if content is not None:
-                        content = self.text_processor.protect_backslashes_in_code(content)
-#                        content = self.text_processor.apply_forward_substitutions(content) # FIXME: la substitución se hace fuera de las guardas de código "`" y "```"
-                        
-                        out.write(f"// {filepath}\n")
-                        out.write(content.strip() + '\n\n')
+                    for chunk in chunks or ():
+                        out.write_question(chunk)
                         question_count += 1
                         print(f"  Added: {rel_path}")
-                
+                    
+                    if out.is_open and out.resumable:
+                        journal.record({'file': rel_path, 'questions': question_count, 'writer': out.checkpoint()})
+            
+            if markdown is not None:
+                markdown.save()
+            journal.finish()
+            if out.sharded:
+                print(f"\n✓ Collection completed: {question_count} questions in {len(out.shard_paths)} shards")
+                for shard_path in out.shard_paths:
+                    print(f"  Shard: {shard_path}")
+            else:
                 print(f"\n✓ Collection completed: {question_count} questions in {output_file}")
-                return True
+            return True
         except IOError as e:
+            if journal is not None:
+                journal.close()
             print(f"Error writing output file {output_file}: {e}", file=sys.stderr)
             return False
@@ -0,0 +1,403 @@
+"""Validation of GIFT and Moodle XML banks with file:line:col diagnostics."""
+
+import bisect
+import codecs
+import os
+import re
+import sys
+import xml.parsers.expat
+
+from .file_utils import FileHandler, READ_ERRORS
+
+
+# Below this many files a worker pool costs more than it saves (pre-commit runs).
+PARALLEL_MIN_FILES = 32
+CHUNK_SIZE = 1024 * 1024
+
+GIFT_TOKEN = re.compile(r'\\.|::|[{}=~]', re.DOTALL)
+GIFT_ANSWER_START = re.compile(r'[=~#]')
+GIFT_TRUE_FALSE = re.compile(r'(?:TRUE|FALSE|T|F)\s*(?:#|$)', re.IGNORECASE)
+GIFT_CORRECT_ANSWER = re.compile(r'(?<!\\)=|%\d')
+GIFT_WEIGHT = re.compile(r'^\s*%-?[\d.]+%')
+GIFT_FEEDBACK = re.compile(r'(?<!\\)#')
+EMBEDDED_ANSWER = re.compile(r'(\d*):([A-Z_]+):(.*)', re.DOTALL)
+EMBEDDED_CORRECT_ANSWER = re.compile(r'(?:^|~)(?:=|%100%)')
+CLOZE_TYPES = {
+    'SHORTANSWER', 'SA', 'MW', 'SHORTANSWER_C', 'SAC', 'MWC', 'NUMERICAL', 'NM',
+    'MULTICHOICE', 'MC', 'MULTICHOICE_V', 'MCV', 'MULTICHOICE_H', 'MCH',
+    'MULTIRESPONSE', 'MR', 'MULTIRESPONSE_H', 'MRH', 'MULTICHOICE_S', 'MCS',
+    'MULTICHOICE_VS', 'MCVS', 'MULTICHOICE_HS', 'MCHS', 'MULTIRESPONSE_S', 'MRS',
+    'MULTIRESPONSE_HS', 'MRHS',
+}
+CATEGORY_CONTEXT = re.compile(r'\$(?:system|coursecategory|course|module|cat[1-4])\$')
+INVALID_XML_CHARS = re.compile('[^\x09\x0A\x0D\x20-\uD7FF\uE000-\uFFFD\U00010000-\U0010FFFF]')
+
+_worker_linter = None
+
+
+def _lint_worker(fmt, path, detect_compression):
+    """Lint one file in a worker process."""
+    global _worker_linter
+    if _worker_linter is None:
+        _worker_linter = BankLinter(FileHandler(fsync=False))
+    return _worker_linter.lint_file(fmt, path, detect_compression)
+
+
+def category_problem(path):
+    """Return why a category path would be rejected, or None if it is valid."""
+    if not path.strip():
+        return "empty category"
+    
+    rest = path
+    if path.startswith('$'):
+        context = CATEGORY_CONTEXT.match(path)
+        if not context:
+            return f"unknown category context in '{path}'"
+        rest = path[context.end():]
+        if not rest:
+            return None
+        if not rest.startswith('/'):
+            return f"expected '/' after category context in '{path}'"
+        rest = rest[1:]
+    
+    # '//' is an escaped slash inside a category name
+    for name in rest.replace('//', '\0').split('/'):
+        if not name.strip():
+            return f"empty category name in '{path}'"
+    return None
+
+
+def embedded_answer_problem(content):
+    """Return why a cloze embedded answer `N:TYPE:answers` is malformed, or None."""
+    match = EMBEDDED_ANSWER.fullmatch(content)
+    if not match:
+        return "malformed embedded answer (expected {N:TYPE:answers})"
+    if match.group(2) not in CLOZE_TYPES:
+        return f"unknown cloze answer type '{match.group(2)}'"
+    if not match.group(3).strip():
+        return "embedded answer has no answers"
+    if not EMBEDDED_CORRECT_ANSWER.search(match.group(3)):
+        return "embedded answer has no correct answer ('=' or '%100%')"
+    return None
+
+
+class _PositionMap:
+    """Maps offsets in text assembled from pieces back to (line, column)."""
+    
+    def __init__(self):
+        self.offsets = []
+        self.positions = []
+        self.pieces = []
+        self.length = 0
+    
+    def add(self, text, line, column):
+        self.offsets.append(self.length)
+        self.positions.append((line, column))
+        self.pieces.append(text)
+        self.length += len(text)
+    
+    def text(self):
+        return ''.join(self.pieces)
+    
+    def locate(self, offset):
+        index = max(bisect.bisect_right(self.offsets, offset) - 1, 0)
+        line, column = self.positions[index]
+        before = self.pieces[index][:offset - self.offsets[index]]
+        newlines = before.count('\n')
+        if newlines:
+            return line + newlines, len(before) - before.rfind('\n')
+        return line, column + len(before)
+
+
+class BankLinter:
+    """Checks banks for problems that make Moodle reject an import.
+    
+    GIFT: unbalanced braces, unescaped special characters, malformed cloze
+    answer blocks and bad $CATEGORY paths. Moodle XML: invalid characters
+    and encoding, well-formedness, bad categories and malformed embedded
+    answers in cloze questions. Every problem is reported as
+    `file:line:column: message`.
+    """
+    
+    EXTENSIONS = {'gift': '.gift', 'xml': '.xml'}
+    
+    def __init__(self, file_handler):
+        self.file_handler = file_handler
+    
+    def expand_paths(self, fmt, paths):
+        """Return the sorted files to lint; directories are searched recursively."""
+        extension = self.EXTENSIONS[fmt]
+        files = []
+        for path in paths:
+            if not os.path.isdir(path):
+                files.append(path)
+                continue
+            for root, dirs, names in os.walk(path):
+                dirs[:] = [d for d in dirs if not d.startswith('.')]
+                files.extend(os.path.join(root, name) for name in names
+                             if name.endswith(extension) and not name.startswith('.'))
+        return sorted(set(files))
+    
+    def lint(self, fmt, paths, jobs=None):
+        """Lint files and directory trees; return True if no problems were found."""
+        files = self.expand_paths(fmt, paths)
+        if not files:
+            print(f"No {self.EXTENSIONS[fmt]} files found.")
+            return True
+        
+        # Only files named on the command line may be compressed; files found
+        # in exported trees are opened directly.
+        named = {path for path in paths if not os.path.isdir(path)}
+        detect = [path in named for path in files]
+        
+        if jobs == 1 or len(files) < PARALLEL_MIN_FILES:
+            results = (self.lint_file(fmt, path, sniff) for path, sniff in zip(files, detect))
+            return self._report(files, results)
+        
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = pool.map(_lint_worker, [fmt] * len(files), files, detect,
+                               chunksize=max(1, min(256, len(files) // (4 * (jobs or os.cpu_count() or 1)))))
+            return self._report(files, results)
+    
+    def lint_file(self, fmt, path, detect_compression=True):
+        """Return (question_count, [(line, column, message)]) for one file.
+        
+        line and column are None for problems that concern the whole file.
+        """
+        try:
+            if fmt == 'gift':
+                question_count, problems = self._lint_gift(path, detect_compression)
+            else:
+                question_count, problems = self._lint_xml(path, detect_compression)
+            return question_count, sorted(problems)
+        except FileNotFoundError:
+            return 0, [(None, None, "file not found")]
+        except READ_ERRORS as e:
+            return 0, [(None, None, f"could not read file: {e}")]
+    
+    def _report(self, files, results):
+        question_count = 0
+        problem_count = 0
+        failed_files = 0
+        for path, (questions, problems) in zip(files, results):
+            question_count += questions
+            if problems:
+                failed_files += 1
+                problem_count += len(problems)
+            for line, column, message in problems:
+                if line is None:
+                    print(f"{path}: {message}")
+                else:
+                    print(f"{path}:{line}:{column}: {message}")
+        
+        if problem_count:
+            print(f"\n✗ Lint found {problem_count} problems in {failed_files} of {len(files)} files", file=sys.stderr)
+            return False
+        print(f"\n✓ Lint passed: {question_count} questions in {len(files)} files")
+        return True
+    
+    def _lint_gift(self, path, detect_compression=True):
+        problems = []
+        question_count = 0
+        question = _PositionMap()
+        
+        def finish_question():
+            nonlocal question, question_count
+            if question.pieces:
+                question_count += 1
+                self._check_gift_question(question, problems)
+                question = _PositionMap()
+        
+        with self.file_handler.open_preserving_escapes(path, detect_compression) as f:
+            for line_number, line in enumerate(f, 1):
+                stripped = line.strip()
+                if not stripped:
+                    finish_question()
+                elif stripped.startswith('//'):
+                    continue
+                elif stripped.startswith('$CATEGORY:'):
+                    finish_question()
+                    category = stripped[len('$CATEGORY:'):].strip()
+                    problem = category_problem(category)
+                    if problem:
+                        problems.append((line_number, line.index('$CATEGORY:') + 1, problem))
+                else:
+                    question.add(line.rstrip('\r\n') + '\n', line_number, 1)
+        finish_question()
+        return question_count, problems
+    
+    def _check_gift_question(self, question, problems):
+        text = question.text()
+        
+        def report(offset, message):
+            line, column = question.locate(offset)
+            problems.append((line, column, message))
+        
+        start = len(text) - len(text.lstrip())
+        title_start = start if text.startswith('::', start) else None
+        in_title = title_start is not None
+        block_start = None
+        specials = []
+        blocks = []
+        
+        for token in GIFT_TOKEN.finditer(text, start + 2 if in_title else start):
+            value = token.group()
+            if value[0] == '\\':
+                continue
+            if in_title:
+                if value == '::':
+                    in_title = False
+                elif value in '{}':
+                    report(token.start(), f"unescaped '{value}' in question title")
+            elif value == '{':
+                if block_start is None:
+                    block_start = token.start()
+                    specials = []
+                else:
+                    report(token.start(), "unescaped '{' inside answer block (escape it as \\{)")
+            elif value == '}':
+                if block_start is None:
+                    report(token.start(), "unmatched '}' (escape it as \\})")
+                else:
+                    blocks.append((block_start, token.start(), specials))
+                    block_start = None
+            elif value in '=~' and block_start is not None:
+                specials.append(token.start())
+        
+        if in_title:
+            report(title_start, "unterminated question title (missing closing '::')")
+        if block_start is not None:
+            report(block_start, "unclosed '{' (missing '}')")
+        
+        cloze = len(blocks) > 1
+        for block_start, block_end, specials in blocks:
+            content = text[block_start + 1:block_end].strip()
+            if EMBEDDED_ANSWER.match(content):
+                problem = embedded_answer_problem(content)
+                if problem:
+                    report(block_start, problem)
+                continue
+            
+            if not content:
+                if cloze:
+                    report(block_start, "empty answer block in cloze question")
+                continue
+            if GIFT_TRUE_FALSE.match(content) or content.startswith('#'):
+                continue
+            if not GIFT_ANSWER_START.match(content):
+                report(block_start, "answer block does not start with '=', '~' or '#'")
+                continue
+            
+            for offset, end in zip(specials, specials[1:] + [block_end]):
+                answer = GIFT_FEEDBACK.split(GIFT_WEIGHT.sub('', text[offset + 1:end], 1), 1)[0]
+                if not answer.strip():
+                    marker = text[offset]
+                    report(offset, f"empty answer after '{marker}' (escape a literal '{marker}' as \\{marker})")
+            if cloze and not GIFT_CORRECT_ANSWER.search(content):
+                report(block_start, "cloze answer block has no correct answer ('=' or '%100%')")
+    
+    def _lint_xml(self, path, detect_compression=True):
+        problems = []
+        state = {'questions': 0, 'stack': [], 'type': None, 'capture': None}
+        parser = xml.parsers.expat.ParserCreate()
+        
+        def start_element(name, attrs):
+            stack = state['stack']
+            if name == 'question':
+                state['type'] = attrs.get('type')
+                if state['type'] != 'category':
+                    state['questions'] += 1
+            elif name == 'text' and len(stack) >= 2 and stack[-2] == 'question' and (
+                    (stack[-1] == 'category' and state['type'] == 'category')
+                    or (stack[-1] == 'questiontext' and state['type'] == 'cloze')):
+                state['capture'] = _PositionMap()
+                state['capture_line'] = parser.CurrentLineNumber
+                state['capture_column'] = parser.CurrentColumnNumber + 1
+            stack.append(name)
+        
+        def end_element(name):
+            state['stack'].pop()
+            capture = state['capture']
+            if name == 'text' and capture is not None:
+                state['capture'] = None
+                if state['type'] == 'category':
+                    problem = category_problem(capture.text().strip())
+                    if problem:
+                        problems.append((state['capture_line'], state['capture_column'], problem))
+                else:
+                    self._check_cloze_text(capture, problems, state['capture_line'], state['capture_column'])
+        
+        def character_data(data):
+            if state['capture'] is not None:
+                state['capture'].add(data, parser.CurrentLineNumber, parser.CurrentColumnNumber + 1)
+        
+        parser.StartElementHandler = start_element
+        parser.EndElementHandler = end_element
+        parser.CharacterDataHandler = character_data
+        
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        line = 1
+        column = 1
+        try:
+            with self.file_handler.open_binary(path, detect_compression) as f:
+                while True:
+                    data = f.read(CHUNK_SIZE)
+                    try:
+                        text = decoder.decode(data, final=not data)
+                    except UnicodeDecodeError as e:
+                        problems.append((line + data.count(b'\n', 0, e.start), None,
+                                         "invalid UTF-8 byte sequence"))
+                        break
+                    
+                    for match in INVALID_XML_CHARS.finditer(text):
+                        before = text[:match.start()]
+                        newlines = before.count('\n')
+                        char_column = match.start() - before.rfind('\n') if newlines else column + match.start()
+                        problems.append((line + newlines, char_column,
+                                         f"invalid XML character U+{ord(match.group()):04X}"))
+                    text = INVALID_XML_CHARS.sub(' ', text)
+                    
+                    newlines = text.count('\n')
+                    column = len(text) - text.rfind('\n') if newlines else column + len(text)
+                    line += newlines
+                    parser.Parse(text, not data)
+                    if not data:
+                        break
+        except xml.parsers.expat.ExpatError as e:
+            problems.append((e.lineno, e.offset + 1, xml.parsers.expat.ErrorString(e.code)))
+        
+        return state['questions'], [(line, column if column is not None else 1, message)
+                                    for line, column, message in problems]
+    
+    def _check_cloze_text(self, capture, problems, element_line, element_column):
+        text = capture.text()
+        
+        def report(offset, message):
+            line, column = capture.locate(offset) if capture.pieces else (element_line, element_column)
+            problems.append((line, column, message))
+        
+        block_start = None
+        block_count = 0
+        for token in re.finditer(r'\\.|[{}]', text, re.DOTALL):
+            value = token.group()
+            if value[0] == '\\':
+                continue
+            if value == '{':
+                if block_start is not None:
+                    report(token.start(), "unescaped '{' inside embedded answer")
+                else:
+                    block_start = token.start()
+            elif block_start is None:
+                report(token.start(), "unmatched '}' in cloze question text")
+            else:
+                block_count += 1
+                problem = embedded_answer_problem(text[block_start + 1:token.start()].strip())
+                if problem:
+                    report(block_start, problem)
+                block_start = None
+        
+        if block_start is not None:
+            report(block_start, "unclosed '{' in cloze question text")
+        elif not block_count:
+            report(0, "cloze question has no embedded answers")
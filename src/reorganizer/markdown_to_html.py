@@ -1,6 +1,46 @@
 """Convert Markdown format questions to HTML for Moodle compatibility."""
 
+import hashlib
+import html
+import json
+import os
 import re
+import sys
+
+
+# Bump whenever the generated HTML changes so cached conversions are not reused.
+CONVERTER_VERSION = '1'
+
+CODE_FENCE = re.compile(r'```(\w*)\n(.*?)\n```', re.DOTALL)
+
+INLINE_MARKUP = re.compile(
+    r'`(?P<code>[^`]+)`'
+    r'|\*\*(?P<bold>[^*]+)\*\*'
+    r'|\*(?P<italic>[^*]+)\*'
+)
+
+MARKDOWN_PATTERN = re.compile(r'```|`[^`]+`|\*\*[^*]+\*\*')
+
+
+def _replace_inline(match):
+    if match.group('code') is not None:
+        return f"<code>{html.escape(match.group('code'), quote=False)}</code>"
+    if match.group('bold') is not None:
+        return f"<strong>{match.group('bold')}</strong>"
+    return f"<em>{match.group('italic')}</em>"
+
+
+def _wrap_paragraphs(text, result):
+    for para in text.split('\n\n'):
+        para = para.strip()
+        if not para:
+            continue
+        
+        # Skip if already wrapped in HTML tags
+        if para.startswith(('<pre>', '<ul>', '<ol>', '<p>')):
+            result.append(para)
+        else:
+            result.append(f'<p>{para}</p>')
 
 
 def convert_markdown_to_html(text):
@@ -11,64 +51,99 @@ def convert_markdown_to_html(text):
     - Code blocks with triple backticks
     - Inline code with single backticks
     - Bold text with **
-    - Lists and paragraphs
+    - Italic text with *
+    - Paragraphs separated by blank lines
+    
+    Fenced code blocks are emitted verbatim (HTML-escaped) as their own
+    block, and inline markup is applied in a single pass so nothing inside
+    code is re-interpreted.
     """
     if not text:
         return text
     
-    # Convert code blocks (```lang\ncode\n```)
-    def replace_code_block(match):
-        lang = match.group(1) if match.group(1) else ''
-        code = match.group(2)
-        return f'<pre><code>{code}</code></pre>'
-    
-    text = re.sub(r'```(\w*)\n(.*?)\n```', replace_code_block, text, flags=re.DOTALL)
-    
-    # Convert inline code (`code`)
-    text = re.sub(r'`([^`]+)`', r'<code>\1</code>', text)
-    
-    # Convert bold (**text**)
-    text = re.sub(r'\*\*([^*]+)\*\*', r'<strong>\1</strong>', text)
-    
-    # Convert italic (*text*)
-    text = re.sub(r'\*([^*]+)\*', r'<em>\1</em>', text)
-    
-    # Wrap paragraphs (lines separated by blank lines)
-    # Split by double newlines
-    paragraphs = text.split('\n\n')
     result = []
-    
-    for para in paragraphs:
-        para = para.strip()
-        if not para:
-            continue
-        
-        # Skip if already wrapped in HTML tags
-        if para.startswith('<pre>') or para.startswith('<ul>') or para.startswith('<ol>'):
-            result.append(para)
-        elif para.startswith('<p>'):
-            result.append(para)
-        else:
-            # Wrap in paragraph tags
-            result.append(f'<p>{para}</p>')
+    position = 0
+    for fence in CODE_FENCE.finditer(text):
+        _wrap_paragraphs(INLINE_MARKUP.sub(_replace_inline, text[position:fence.start()]), result)
+        result.append(f'<pre><code>{html.escape(fence.group(2), quote=False)}</code></pre>')
+        position = fence.end()
+    _wrap_paragraphs(INLINE_MARKUP.sub(_replace_inline, text[position:]), result)
     
     return '\n'.join(result)
 
 
 def needs_conversion(text):
     """Check if text contains markdown that needs conversion."""
-    if not text:
+    if not text or ('`' not in text and '**' not in text):
         return False
     
-    # Check for markdown patterns
-    patterns = [
-        r'```',           # Code blocks
-        r'`[^`]+`',      # Inline code
-        r'\*\*[^*]+\*\*', # Bold
-    ]
+    return MARKDOWN_PATTERN.search(text) is not None
+
+
+def default_cache_file():
+    """Return the default location of the persistent conversion cache."""
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'reorganizer', 'markdown.json')
+
+
+class MarkdownConverter:
+    """Converts question text, memoizing results by content hash.
+    
+    Text without Markdown is rejected by `needs_conversion` before any
+    hashing. Conversions are kept in memory and, with a `cache_file`,
+    persisted across runs.
+    """
+    
+    VERSION = CONVERTER_VERSION
+    
+    def __init__(self, cache_file=None, file_handler=None):
+        self.cache_file = cache_file
+        self.file_handler = file_handler
+        self.cache = {}
+        self.new_entries = {}
+        if cache_file:
+            self._load()
+    
+    def convert(self, text):
+        """Return the HTML for `text`, or None if it contains no Markdown."""
+        if not needs_conversion(text):
+            return None
+        
+        key = hashlib.sha256(f"{CONVERTER_VERSION}\0{text}".encode('utf-8')).hexdigest()
+        converted = self.cache.get(key)
+        if converted is None:
+            converted = convert_markdown_to_html(text)
+            self.cache[key] = converted
+            self.new_entries[key] = converted
+        return converted
+    
+    def take_new_entries(self):
+        """Return and forget the conversions made since the last call."""
+        entries, self.new_entries = self.new_entries, {}
+        return entries
+    
+    def merge(self, entries):
+        """Add conversions made elsewhere (e.g. by worker processes)."""
+        self.cache.update(entries)
+        self.new_entries.update(entries)
     
-    for pattern in patterns:
-        if re.search(pattern, text):
-            return True
+    def save(self):
+        """Persist the cache if anything new was converted."""
+        if not self.cache_file or not self.new_entries:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or '.', exist_ok=True)
+            with self.file_handler.atomic_open(self.cache_file) as f:
+                json.dump(self.cache, f, ensure_ascii=False)
+            self.new_entries = {}
+        except OSError as e:
+            print(f"  ⚠ Warning: Could not save Markdown cache {self.cache_file}: {e}", file=sys.stderr)
     
-    return False
+    def _load(self):
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                self.cache = json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            print(f"  ⚠ Warning: Ignoring unreadable Markdown cache {self.cache_file}: {e}", file=sys.stderr)
@@ -0,0 +1,163 @@
+"""Concurrent export of many monolithic banks into one directory tree."""
+
+import glob
+import os
+import shutil
+import sys
+import tempfile
+
+from .file_utils import FileHandler, FilenameRegistry, READ_ERRORS
+from .workers import get_processor
+
+
+# Prefix of the staging directory created next to the output tree: workers
+# write there and the parent renames files into place. Being a sibling keeps
+# it on the same filesystem (atomic renames) but out of the tree, so a
+# leftover from a killed run is never collected.
+STAGING_PREFIX = '.reorganizer-staging-'
+
+
+def _run_guarded(function, *args):
+    """Run a worker step, turning read/parse failures into an error message."""
+    from xml.etree.ElementTree import ParseError
+    try:
+        return function(*args), None
+    except ParseError as e:
+        return None, f"Could not parse XML: {e}"
+    except FileNotFoundError:
+        return None, "File not found"
+    except READ_ERRORS as e:
+        return None, f"Could not read file: {e}"
+
+
+def _stage_input(fmt, input_file, staging_dir, fsync):
+    """Export one input under `staging_dir`; return (category_path, base_filename, staged path) per question."""
+    processor = get_processor(fmt, fsync)
+    registry = FilenameRegistry()
+    staged = []
+    processor.file_handler.defer_syncs()
+    try:
+        for category_path, title, payload in processor.iter_questions(input_file):
+            output_filepath = processor.write_question(staging_dir, category_path, title, payload, registry)
+            if output_filepath:
+                staged.append((category_path, processor.file_handler.sanitize_filename(title), output_filepath))
+    finally:
+        processor.file_handler.sync_deferred(stop=True)
+    return staged
+
+
+class MultiExporter:
+    """Exports many inputs into one tree with a global filename registry.
+    
+    Every input is read once: workers export their input concurrently into
+    a private staging directory, then the parent allocates final names in
+    sorted input order and renames the staged files into place. Names are
+    therefore identical no matter how workers are scheduled.
+    """
+    
+    def __init__(self, fsync=True):
+        self.fsync = fsync
+    
+    def expand_inputs(self, patterns):
+        """Expand glob patterns into a sorted, de-duplicated list of paths.
+        
+        A pattern naming an existing file is taken literally, so names such
+        as `course[1].gift` are not treated as globs.
+        """
+        inputs = []
+        for pattern in patterns:
+            if os.path.exists(pattern) or not glob.has_magic(pattern):
+                matches = [pattern]
+            else:
+                matches = glob.glob(pattern, recursive=True)
+            inputs.extend(matches)
+        return sorted(set(inputs))
+    
+    def export(self, fmt, patterns, base_output_dir, jobs=None):
+        """Export every input matching `patterns` into `base_output_dir`."""
+        inputs = self.expand_inputs(patterns)
+        if not inputs:
+            print(f"Error: No input files match {' '.join(patterns)}", file=sys.stderr)
+            return False
+        
+        print(f"Exporting {len(inputs)} {fmt.upper()} inputs")
+        print(f"Output directory: {base_output_dir}")
+        
+        output_parent = os.path.dirname(os.path.abspath(base_output_dir))
+        try:
+            os.makedirs(output_parent, exist_ok=True)
+            staging_root = tempfile.mkdtemp(prefix=STAGING_PREFIX, dir=output_parent)
+        except OSError as e:
+            print(f"Error: Could not create a staging directory in {output_parent}: {e}", file=sys.stderr)
+            return False
+        file_handler = FileHandler(self.fsync)
+        extension = get_processor(fmt, self.fsync).EXTENSION
+        registry = FilenameRegistry()
+        output_dirs = set()
+        results = {}
+        
+        try:
+            with self._executor(jobs) as pool:
+                futures = [pool.submit(_run_guarded, _stage_input, fmt, input_file,
+                                       os.path.join(staging_root, str(index)), self.fsync)
+                           for index, input_file in enumerate(inputs)]
+                for input_file, future in zip(inputs, futures):
+                    staged, error = future.result()
+                    if error:
+                        results[input_file] = (0, error)
+                        continue
+                    for category_path, base_filename, staged_path in staged:
+                        output_dir = self._output_dir(base_output_dir, category_path)
+                        filename = registry.allocate(output_dir, base_filename, extension)
+                        os.makedirs(output_dir, exist_ok=True)
+                        os.replace(staged_path, os.path.join(output_dir, filename))
+                        output_dirs.add(output_dir)
+                    results[input_file] = (len(staged), None)
+        finally:
+            shutil.rmtree(staging_root, ignore_errors=True)
+        
+        if self.fsync:
+            for output_dir in sorted(output_dirs):
+                file_handler.sync_directory(output_dir)
+        
+        print("\nSummary:")
+        total = 0
+        failed = 0
+        for input_file in inputs:
+            count, error = results[input_file]
+            if error:
+                failed += 1
+                print(f"  ✗ {input_file}: {error}")
+            else:
+                total += count
+                print(f"  ✓ {input_file}: {count} questions")
+        
+        print(f"\n✓ Export completed: {total} questions from {len(inputs) - failed} of {len(inputs)} inputs")
+        return failed == 0
+    
+    @staticmethod
+    def _output_dir(base_output_dir, category_path):
+        return os.path.join(base_output_dir, category_path) if category_path else base_output_dir
+    
+    @staticmethod
+    def _executor(jobs):
+        if jobs == 1:
+            return _InlineExecutor()
+        from concurrent.futures import ProcessPoolExecutor
+        return ProcessPoolExecutor(max_workers=jobs)
+
+
+class _InlineExecutor:
+    """Executor with the ProcessPoolExecutor interface that runs in-process."""
+    
+    def submit(self, function, *args):
+        from concurrent.futures import Future
+        future = Future()
+        future.set_result(function(*args))
+        return future
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
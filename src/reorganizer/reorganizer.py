@@ -1,34 +1,141 @@
 """Main reorganizer class coordinating all operations."""
 
-from .text_utils import TextProcessor
+from functools import cached_property
+
 from .file_utils import FileHandler
-from .xml_utils import XMLProcessor
-from .gift_processor import GIFTProcessor
-from .xml_processor import MoodleXMLProcessor
 
 
 class QuestionBackupReorganizer:
-    """Main class for handling backup and reorganization of question banks."""
+    """Main class for handling backup and reorganization of question banks.
+    
+    Processors are built (and their modules imported) on first use, so a
+    GIFT-only run never loads the XML machinery.
+    """
+    
+    def __init__(self, fsync=True):
+        self.fsync = fsync
+        self.file_handler = FileHandler(fsync)
+        self._markdown_converters = {}
+    
+    @cached_property
+    def text_processor(self):
+        from .text_utils import TextProcessor
+        return TextProcessor()
+    
+    @cached_property
+    def xml_utils(self):
+        from .xml_utils import XMLProcessor
+        return XMLProcessor(self.text_processor)
+    
+    @cached_property
+    def gift_processor(self):
+        from .gift_processor import GIFTProcessor
+        return GIFTProcessor(self.text_processor, self.file_handler)
     
-    def __init__(self):
-        self.text_processor = TextProcessor()
-        self.file_handler = FileHandler()
-        self.xml_utils = XMLProcessor(self.text_processor)
-        self.gift_processor = GIFTProcessor(self.text_processor, self.file_handler)
-        self.xml_processor = MoodleXMLProcessor(self.text_processor, self.file_handler, self.xml_utils)
+    @cached_property
+    def xml_processor(self):
+        from .xml_processor import MoodleXMLProcessor
+        return MoodleXMLProcessor(self.text_processor, self.file_handler, self.xml_utils)
     
-    def export_gift_to_structure(self, input_file, base_output_dir):
+    @cached_property
+    def differ(self):
+        from .diff_processor import BankDiffer
+        return BankDiffer(self.gift_processor, self.xml_processor)
+    
+    @cached_property
+    def multi_exporter(self):
+        from .multi_export import MultiExporter
+        return MultiExporter(self.fsync)
+    
+    @cached_property
+    def snapshot_manager(self):
+        from .snapshot_store import SnapshotManager
+        return SnapshotManager(self.gift_processor, self.xml_processor, self.file_handler)
+    
+    @cached_property
+    def linter(self):
+        from .lint_processor import BankLinter
+        return BankLinter(self.file_handler)
+    
+    def export_gift_to_structure(self, input_file, base_output_dir, resume=False):
         """Export GIFT questions to directory structure."""
-        return self.gift_processor.export_to_structure(input_file, base_output_dir)
+        return self.gift_processor.export_to_structure(input_file, base_output_dir, resume)
+    
+    def export_gift_files_to_structure(self, input_patterns, base_output_dir, jobs=None):
+        """Export many GIFT files (paths or globs) concurrently into one structure."""
+        return self.multi_exporter.export('gift', input_patterns, base_output_dir, jobs)
     
-    def collect_gift_from_structure(self, base_input_dir, output_file):
+    def collect_gift_from_structure(self, base_input_dir, output_file, max_size=None, max_questions=None, resume=False,
+                                    markdown=False, markdown_cache=None, jobs=None):
         """Collect GIFT questions from directory structure."""
-        return self.gift_processor.collect_from_structure(base_input_dir, output_file)
+        return self.gift_processor.collect_from_structure(
+            base_input_dir, output_file, max_size, max_questions, resume,
+            self._markdown_converter(markdown, markdown_cache), jobs)
     
-    def export_xml_to_structure(self, input_file, base_output_dir):
+    def export_xml_to_structure(self, input_file, base_output_dir, resume=False):
         """Export Moodle XML questions to directory structure."""
-        return self.xml_processor.export_to_structure(input_file, base_output_dir)
+        return self.xml_processor.export_to_structure(input_file, base_output_dir, resume)
+    
+    def export_xml_files_to_structure(self, input_patterns, base_output_dir, jobs=None):
+        """Export many Moodle XML files (paths or globs) concurrently into one structure."""
+        return self.multi_exporter.export('xml', input_patterns, base_output_dir, jobs)
     
-    def collect_xml_from_structure(self, base_input_dir, output_file):
+    def collect_xml_from_structure(self, base_input_dir, output_file, max_size=None, max_questions=None, resume=False,
+                                   markdown=False, markdown_cache=None, jobs=None):
         """Collect Moodle XML questions from directory structure."""
-        return self.xml_processor.collect_from_structure(base_input_dir, output_file)
+        return self.xml_processor.collect_from_structure(
+            base_input_dir, output_file, max_size, max_questions, resume,
+            self._markdown_converter(markdown, markdown_cache), jobs)
+    
+    def diff_gift_banks(self, old_file, new_file, export_dir=None):
+        """Compare two GIFT banks, optionally exporting the changed questions."""
+        return self.differ.diff('gift', old_file, new_file, export_dir)
+    
+    def diff_xml_banks(self, old_file, new_file, export_dir=None):
+        """Compare two Moodle XML banks, optionally exporting the changed questions."""
+        return self.differ.diff('xml', old_file, new_file, export_dir)
+    
+    def snapshot_gift(self, input_file, store_dir, name=None):
+        """Store a GIFT bank as an incremental snapshot."""
+        return self.snapshot_manager.snapshot('gift', input_file, store_dir, name)
+    
+    def snapshot_xml(self, input_file, store_dir, name=None):
+        """Store a Moodle XML bank as an incremental snapshot."""
+        return self.snapshot_manager.snapshot('xml', input_file, store_dir, name)
+    
+    def snapshot_history(self, store_dir):
+        """List the snapshots kept in a store."""
+        return self.snapshot_manager.history(store_dir)
+    
+    def restore_snapshot(self, store_dir, name, base_output_dir):
+        """Rebuild the directory structure of a snapshot."""
+        return self.snapshot_manager.restore(store_dir, name, base_output_dir)
+    
+    def collect_gift_from_snapshot(self, store_dir, name, output_file, max_size=None, max_questions=None, resume=False,
+                                   markdown=False, markdown_cache=None, jobs=None):
+        """Collect a GIFT snapshot directly from the store."""
+        return self.snapshot_manager.collect('gift', store_dir, name, output_file, max_size, max_questions, resume,
+                                             self._markdown_converter(markdown, markdown_cache), jobs)
+    
+    def collect_xml_from_snapshot(self, store_dir, name, output_file, max_size=None, max_questions=None, resume=False,
+                                   markdown=False, markdown_cache=None, jobs=None):
+        """Collect a Moodle XML snapshot directly from the store."""
+        return self.snapshot_manager.collect('xml', store_dir, name, output_file, max_size, max_questions, resume,
+                                             self._markdown_converter(markdown, markdown_cache), jobs)
+    
+    def lint_gift(self, paths, jobs=None):
+        """Validate GIFT files and exported trees."""
+        return self.linter.lint('gift', paths, jobs)
+    
+    def lint_xml(self, paths, jobs=None):
+        """Validate Moodle XML files and exported trees."""
+        return self.linter.lint('xml', paths, jobs)
+    
+    def _markdown_converter(self, markdown, markdown_cache):
+        # One converter per cache file, so batch jobs share conversions in memory.
+        if not markdown:
+            return None
+        if markdown_cache not in self._markdown_converters:
+            from .markdown_to_html import MarkdownConverter
+            self._markdown_converters[markdown_cache] = MarkdownConverter(markdown_cache, self.file_handler)
+        return self._markdown_converters[markdown_cache]
@@ -0,0 +1,149 @@
+"""Output writer that splits monolithic files into size-bounded shards."""
+
+import os
+import sys
+
+
+class ShardWriter:
+    """Streams questions to one output file or to numbered shards.
+    
+    Shards are only cut on question boundaries, and the active category
+    marker is re-emitted at the start of every shard so each one can be
+    imported on its own. Each shard is written through a partial file and
+    renamed when complete; `checkpoint`/`restore` let an interrupted run
+    continue from the last recorded question.
+    """
+    
+    def __init__(self, file_handler, output_file, header='', footer='', max_size=None, max_questions=None):
+        self.file_handler = file_handler
+        self.output_file = output_file
+        self.header = header
+        self.footer = footer
+        self.max_size = max_size
+        self.max_questions = max_questions
+        self.sharded = bool(max_size or max_questions)
+        # Compressed streams cannot be truncated back to a checkpoint.
+        self.resumable = not file_handler.is_compressed(output_file)
+        
+        self.shard_paths = []
+        self._out = None
+        self._size = 0
+        self._questions = 0
+        self._category = None
+        self._category_written = False
+    
+    def shard_path(self, index):
+        """Return the path of shard number `index` (1-based)."""
+        if not self.sharded:
+            return self.output_file
+        base, compression = self.file_handler.split_compression_suffix(self.output_file)
+        stem, ext = os.path.splitext(base)
+        return f"{stem}_{index:03d}{ext}{compression}"
+    
+    def set_category(self, category_chunk):
+        """Set the category marker written before the next question."""
+        self._category = category_chunk
+        self._category_written = False
+    
+    def write_question(self, question_chunk):
+        """Write one question, opening a new shard first if limits require it."""
+        pending = '' if self._category_written or self._category is None else self._category
+        
+        if self._out is None:
+            self._open_next()
+        elif self._would_overflow(pending + question_chunk):
+            self._close_current()
+            self._open_next()
+        
+        if not self._category_written and self._category is not None:
+            self._write(self._category)
+            self._category_written = True
+        
+        self._write(question_chunk)
+        self._questions += 1
+    
+    @property
+    def is_open(self):
+        """True while a shard is being written."""
+        return self._out is not None
+    
+    def checkpoint(self):
+        """Return the writer state after the last question.
+        
+        The shard is forced to disk with the next journal group, before the
+        state is recorded.
+        """
+        self.file_handler.sync(self._out, deferred=True)
+        return {
+            'shard': len(self.shard_paths),
+            'offset': self._out.tell(),
+            'size': self._size,
+            'shard_questions': self._questions,
+            'category': self._category,
+            'category_written': self._category_written,
+        }
+    
+    def restore(self, state):
+        """Reopen the shard recorded by `checkpoint` and continue after it."""
+        self.shard_paths = [self.shard_path(index) for index in range(1, state['shard'] + 1)]
+        path = self.shard_paths[-1]
+        partial = path + self.file_handler.PARTIAL_SUFFIX
+        if not os.path.exists(partial) and os.path.exists(path):
+            os.replace(path, partial)
+        
+        self._out = self.file_handler.open_partial(path, resume_offset=state['offset'])
+        self._size = state['size']
+        self._questions = state['shard_questions']
+        self._category = state['category']
+        self._category_written = state['category_written']
+    
+    def close(self):
+        """Finish the current shard; an empty output still gets header and footer."""
+        if self._out is None:
+            self._open_next()
+        self._close_current()
+    
+    def _would_overflow(self, chunk):
+        if self._questions == 0:
+            return False
+        if self.max_questions and self._questions >= self.max_questions:
+            return True
+        if self.max_size:
+            chunk_size = len(chunk.encode('utf-8'))
+            footer_size = len(self.footer.encode('utf-8'))
+            if self._size + chunk_size + footer_size > self.max_size:
+                return True
+        return False
+    
+    def _open_next(self):
+        path = self.shard_path(len(self.shard_paths) + 1)
+        self._out = self.file_handler.open_partial(path)
+        self.shard_paths.append(path)
+        self._size = 0
+        self._questions = 0
+        self._category_written = False
+        self._write(self.header)
+    
+    def _close_current(self):
+        self._write(self.footer)
+        self.file_handler.commit_partial(self._out, self.shard_paths[-1])
+        self._out = None
+        if self.sharded and self.max_size and self._size > self.max_size:
+            print(f"  ⚠ Warning: {self.shard_paths[-1]} exceeds --max-size "
+                  f"(single question larger than the limit)", file=sys.stderr)
+    
+    def _write(self, chunk):
+        if chunk:
+            self._out.write(chunk)
+            self._size += len(chunk.encode('utf-8'))
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._out is not None:
+            # Keep the partial shard so that --resume can continue it.
+            self._out.close()
+        return False
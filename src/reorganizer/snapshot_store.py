@@ -0,0 +1,211 @@
+"""Content-addressed snapshot store for incremental question bank backups."""
+
+import hashlib
+import json
+import os
+import shutil
+import sys
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+from .file_utils import FilenameRegistry, READ_ERRORS
+
+
+class SnapshotStore:
+    """On-disk store of question objects and per-snapshot manifests.
+    
+    Layout::
+    
+        store/objects/ab/cdef...   question file contents, named by SHA-256
+        store/snapshots/NAME.json  format, source and (path, hash) entries
+    
+    Identical questions are stored once no matter how many snapshots
+    reference them.
+    """
+    
+    def __init__(self, store_dir, file_handler):
+        self.store_dir = store_dir
+        self.file_handler = file_handler
+        self.objects_dir = os.path.join(store_dir, 'objects')
+        self.snapshots_dir = os.path.join(store_dir, 'snapshots')
+    
+    def object_path(self, content_hash):
+        """Return the path of the object with `content_hash`."""
+        return os.path.join(self.objects_dir, content_hash[:2], content_hash[2:])
+    
+    def put_object(self, content):
+        """Store `content` (str) if new; return (hash, whether it was added)."""
+        data = content.encode('utf-8')
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self.object_path(content_hash)
+        if os.path.exists(path):
+            return content_hash, False
+        
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.file_handler.atomic_open(path, binary=True) as f:
+            f.write(data)
+        return content_hash, True
+    
+    @staticmethod
+    def is_valid_name(name):
+        """Return True if `name` can be used as a snapshot name (no path components)."""
+        separators = {'/', os.sep, os.altsep} - {None}
+        return bool(name) and '..' not in name and not any(sep in name for sep in separators)
+    
+    def manifest_path(self, name):
+        """Return the manifest path of snapshot `name`."""
+        return os.path.join(self.snapshots_dir, f"{name}.json")
+    
+    def write_manifest(self, name, manifest):
+        """Write the manifest of snapshot `name`."""
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        with self.file_handler.atomic_open(self.manifest_path(name)) as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+    
+    def read_manifest(self, name):
+        """Read the manifest of snapshot `name`; raises OSError if missing."""
+        with open(self.manifest_path(name), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    
+    def list_snapshots(self):
+        """Return snapshot names sorted by name (timestamps sort chronologically)."""
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(file[:-5] for file in os.listdir(self.snapshots_dir) if file.endswith('.json'))
+
+
+class SnapshotManager:
+    """Creates, restores and collects snapshots through the export/collect paths."""
+    
+    def __init__(self, gift_processor, xml_processor, file_handler):
+        self.processors = {'gift': gift_processor, 'xml': xml_processor}
+        self.file_handler = file_handler
+    
+    def snapshot(self, fmt, input_file, store_dir, name=None):
+        """Store every question of `input_file` and write a manifest for it."""
+        processor = self.processors[fmt]
+        store = SnapshotStore(store_dir, self.file_handler)
+        name = name or datetime.now().strftime('%Y%m%d-%H%M%S')
+        
+        if not store.is_valid_name(name):
+            print(f"Error: Invalid snapshot name '{name}' (path separators and '..' are not allowed).",
+                  file=sys.stderr)
+            return False
+        if os.path.exists(store.manifest_path(name)):
+            print(f"Error: Snapshot '{name}' already exists in {store_dir}.", file=sys.stderr)
+            return False
+        
+        print(f"Creating snapshot '{name}' of {fmt.upper()} bank: {input_file}")
+        print(f"Store: {store_dir}")
+        
+        filename_registry = FilenameRegistry()
+        entries = []
+        new_objects = 0
+        
+        # One directory sync per fan-out directory; the objects are durable
+        # before the manifest that references them is written.
+        self.file_handler.defer_syncs()
+        try:
+            for category_path, title, payload in processor.iter_questions(input_file):
+                base_filename = processor.file_handler.sanitize_filename(title)
+                filename = filename_registry.allocate(category_path, base_filename, processor.EXTENSION)
+                rel_path = os.path.join(category_path, filename).replace(os.sep, '/')
+                
+                content_hash, added = store.put_object(processor.render_question(payload))
+                entries.append({'path': rel_path, 'hash': content_hash})
+                new_objects += added
+        except ET.ParseError as e:
+            print(f"Error: Could not parse XML: {e}", file=sys.stderr)
+            return False
+        except READ_ERRORS as e:
+            print(f"Error: Could not create snapshot: {e}", file=sys.stderr)
+            return False
+        finally:
+            self.file_handler.sync_deferred(stop=True)
+        
+        try:
+            store.write_manifest(name, {
+                'format': fmt,
+                'source': os.path.abspath(input_file),
+                'created': datetime.now().isoformat(timespec='seconds'),
+                'questions': entries,
+            })
+        except OSError as e:
+            print(f"Error: Could not write snapshot manifest: {e}", file=sys.stderr)
+            return False
+        
+        print(f"\n✓ Snapshot completed: {len(entries)} questions, {new_objects} new objects")
+        return True
+    
+    def history(self, store_dir):
+        """Print every snapshot in the store, oldest first."""
+        store = SnapshotStore(store_dir, self.file_handler)
+        names = store.list_snapshots()
+        if not names:
+            print(f"No snapshots found in {store_dir}.")
+            return True
+        
+        for name in names:
+            try:
+                manifest = store.read_manifest(name)
+            except (OSError, ValueError) as e:
+                print(f"  {name}: unreadable manifest ({e})", file=sys.stderr)
+                continue
+            print(f"  {name}  {manifest['created']}  {manifest['format']:4}  "
+                  f"{len(manifest['questions']):6} questions  {manifest['source']}")
+        return True
+    
+    def restore(self, store_dir, name, base_output_dir):
+        """Rebuild the directory tree of snapshot `name` in `base_output_dir`."""
+        store, manifest = self._load(store_dir, name)
+        if manifest is None:
+            return False
+        
+        print(f"Restoring snapshot '{name}' to: {base_output_dir}")
+        question_count = 0
+        self.file_handler.defer_syncs()
+        try:
+            for entry in manifest['questions']:
+                output_filepath = os.path.join(base_output_dir, *entry['path'].split('/'))
+                try:
+                    os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+                    with open(store.object_path(entry['hash']), 'rb') as src, \
+                            self.file_handler.atomic_open(output_filepath, binary=True) as dst:
+                        shutil.copyfileobj(src, dst)
+                    question_count += 1
+                except OSError as e:
+                    print(f"  Error restoring {entry['path']}: {e}", file=sys.stderr)
+        finally:
+            self.file_handler.sync_deferred(stop=True)
+        
+        print(f"\n✓ Restore completed: {question_count} questions")
+        return question_count == len(manifest['questions'])
+    
+    def collect(self, fmt, store_dir, name, output_file, max_size=None, max_questions=None, resume=False,
+                markdown=None, jobs=None):
+        """Collect snapshot `name` straight from the object store into `output_file`."""
+        store, manifest = self._load(store_dir, name)
+        if manifest is None:
+            return False
+        if manifest['format'] != fmt:
+            print(f"Error: Snapshot '{name}' is {manifest['format']}, not {fmt}.", file=sys.stderr)
+            return False
+        
+        print(f"Collecting {fmt.upper()} from snapshot '{name}' in: {store_dir}")
+        print(f"Output file: {output_file}")
+        
+        entries = sorted((os.path.join(*entry['path'].split('/')), store.object_path(entry['hash']), entry['path'])
+                         for entry in manifest['questions'])
+        return self.processors[fmt].collect_files(entries, output_file, max_size, max_questions, resume,
+                                                  markdown, jobs)
+    
+    def _load(self, store_dir, name):
+        store = SnapshotStore(store_dir, self.file_handler)
+        if not store.is_valid_name(name):
+            print(f"Error: Invalid snapshot name '{name}'.", file=sys.stderr)
+            return store, None
+        try:
+            return store, store.read_manifest(name)
+        except (OSError, ValueError) as e:
+            print(f"Error: Could not read snapshot '{name}': {e}", file=sys.stderr)
+            return store, None
@@ -1,5 +1,6 @@
 """Text processing utilities for handling escape sequences and special characters."""
 
+import html
 import re
 import sys
 
@@ -27,6 +28,25 @@ class TextProcessor:
             "&#38;": "＆",
             "&nbsp;": "　",
         }
+        
+        self.fullwidth_to_conventional = str.maketrans({
+            "⩵": "==", "＝": "=", "＃": "#", "｛": "{", "｝": "}",
+            "＞": ">", "＜": "<", "［": "[", "］": "]", "＆": "&",
+            "＂": '"', "＇": "'", "　": " ", "＼": "\\",
+        })
+    
+    def normalize_for_comparison(self, text):
+        """Normalize text so that equivalent question content compares equal.
+        
+        Undoes HTML entities and the fullwidth rewrites applied on export,
+        and collapses whitespace.
+        """
+        if not text:
+            return ''
+        
+        text = html.unescape(text)
+        text = text.translate(self.fullwidth_to_conventional)
+        return ' '.join(text.split())
     
     def apply_reverse_substitutions(self, text):
         """DISABLED: No longer converts fullwidth to conventional."""
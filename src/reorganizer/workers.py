@@ -0,0 +1,15 @@
+"""Per-process processor cache shared by the export and collect worker pools."""
+
+
+_worker_reorganizer = None
+
+
+def get_processor(fmt, fsync=True):
+    """Return the processor for `fmt`, building one reorganizer per worker process."""
+    global _worker_reorganizer
+    if _worker_reorganizer is None:
+        from .reorganizer import QuestionBackupReorganizer
+        _worker_reorganizer = QuestionBackupReorganizer(fsync)
+    if fmt == 'gift':
+        return _worker_reorganizer.gift_processor
+    return _worker_reorganizer.xml_processor
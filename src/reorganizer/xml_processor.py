@@ -1,99 +1,200 @@
 """Moodle XML format processor for export and collect operations."""
 
+import hashlib
 import os
+import re
 import sys
 import xml.etree.ElementTree as ET
 
+from .checkpoint import CheckpointJournal, COLLECT_JOURNAL_SUFFIX, EXPORT_JOURNAL
+from .collect_pool import iter_rendered_entries
+from .file_utils import FilenameRegistry, InputError, READ_ERRORS, guard_input
+from .shard_utils import ShardWriter
+
 
 class MoodleXMLProcessor:
     """Handles Moodle XML format export and collection."""
     
+    EXTENSION = 'xml'
+    BACKUP_EXTENSION = '.mbz'
+    QUESTION_TEXT = re.compile(
+        r'(?P<open><questiontext\b[^>]*>)(?P<text_open>\s*<text>)<!\[CDATA\[(?P<text>.*?)\]\]>', re.DOTALL)
+    TEXT_FORMAT = re.compile(r'\bformat="([^"]*)"')
+    MARKDOWN_FORMATS = ('markdown', 'moodle_auto_format')
+    
     def __init__(self, text_processor, file_handler, xml_utils):
         self.text_processor = text_processor
         self.file_handler = file_handler
         self.xml_utils = xml_utils
     
-    def export_to_structure(self, input_file, base_output_dir):
-        """Export Moodle XML questions to directory structure."""
-        print(f"Exporting Moodle XML from: {input_file}")
-        print(f"Output directory: {base_output_dir}")
+    def iter_questions(self, input_file):
+        """Stream (category_path, name, question element) for every named question.
         
-        try:
-            cleaned_xml = self.xml_utils.preprocess_xml_file(input_file)
-            
-            if cleaned_xml is None:
-                print(f"Error: Could not read file '{input_file}'.", file=sys.stderr)
-                return False
-            
-            root = ET.fromstring(cleaned_xml)
-        except ET.ParseError as e:
-            print(f"Error: Could not parse XML: {e}", file=sys.stderr)
-            print(f"Suggestion: File may contain invalid XML characters", file=sys.stderr)
-            return False
-        except FileNotFoundError:
-            print(f"Error: File '{input_file}' not found.", file=sys.stderr)
-            return False
+        Moodle course backups (.mbz) are read as a stream: only their
+        questions.xml entry is parsed, nothing is extracted to disk.
+        
+        Raises OSError if the file cannot be read and ET.ParseError on malformed XML.
+        """
+        if input_file.lower().endswith(self.BACKUP_EXTENSION):
+            yield from self._iter_backup_questions(input_file)
+            return
         
         current_category = ''
-        question_count = 0
-        used_filenames = {}
         
-        for question in root.findall('question'):
+        for question in self.xml_utils.iter_quiz_elements(input_file):
             qtype = question.get('type')
             
             if qtype == 'category':
                 category_elem = question.find('category/text')
                 if category_elem is not None and category_elem.text:
-                    category_path = category_elem.text
-                    path_parts = [self.file_handler.sanitize_dirname(part) for part in category_path.split('/') 
-                                 if part.strip() and part != '$course$']
-                    current_category = os.path.join(*path_parts) if path_parts else ''
+                    current_category = self.category_dir(category_elem.text)
                 continue
             
             name_elem = question.find('name/text')
             if name_elem is None or not name_elem.text:
                 continue
             
-            question_name = name_elem.text.strip()
-            base_filename = self.file_handler.sanitize_filename(question_name)
-            
-            output_dir = os.path.join(base_output_dir, current_category) if current_category else base_output_dir
-            os.makedirs(output_dir, exist_ok=True)
-            
-            if output_dir not in used_filenames:
-                used_filenames[output_dir] = {}
+            yield current_category, name_elem.text.strip(), question
+    
+    def category_dir(self, category_path):
+        """Map a Moodle category path ($course$/A/B) to its relative directory (A/B)."""
+        path_parts = [self.file_handler.sanitize_dirname(part) for part in category_path.split('/') 
+                     if part.strip() and part != '$course$']
+        return os.path.join(*path_parts) if path_parts else ''
+    
+    def _iter_backup_questions(self, backup_file):
+        from .backup_reader import MoodleBackupReader
+        
+        for category_path, name, question in MoodleBackupReader().iter_questions(backup_file):
+            yield self.category_dir(category_path), name, question
+    
+    @staticmethod
+    def _report_read_error(input_file, error):
+        if isinstance(error, ET.ParseError):
+            print(f"Error: Could not parse XML: {error}", file=sys.stderr)
+            print(f"Suggestion: File may contain invalid XML characters", file=sys.stderr)
+        elif isinstance(error, FileNotFoundError):
+            print(f"Error: File '{input_file}' not found.", file=sys.stderr)
+        else:
+            print(f"Error: Could not read file '{input_file}': {error}", file=sys.stderr)
+    
+    def question_path(self, base_output_dir, category_path, question_name, filename_registry):
+        """Allocate the output path of one question."""
+        base_filename = self.file_handler.sanitize_filename(question_name)
+        output_dir = os.path.join(base_output_dir, category_path) if category_path else base_output_dir
+        filename = filename_registry.allocate(output_dir, base_filename, self.EXTENSION)
+        return os.path.join(output_dir, filename)
+    
+    def write_question(self, base_output_dir, category_path, question_name, question, filename_registry):
+        """Write one question as a standalone XML file; return its path or None on error."""
+        output_filepath = self.question_path(base_output_dir, category_path, question_name, filename_registry)
+        os.makedirs(os.path.dirname(output_filepath), exist_ok=True)
+        
+        try:
+            xml_final = self.render_question(question)
             
-            if base_filename in used_filenames[output_dir]:
-                used_filenames[output_dir][base_filename] += 1
-                filename = f"{base_filename}_{used_filenames[output_dir][base_filename]}.xml"
-            else:
-                used_filenames[output_dir][base_filename] = 0
-                filename = f"{base_filename}.xml"
+            with self.file_handler.atomic_open(output_filepath) as f:
+                f.write(xml_final)
             
-            output_filepath = os.path.join(output_dir, filename)
+            return output_filepath
+        except IOError as e:
+            print(f"  Error writing {output_filepath}: {e}", file=sys.stderr)
+            return None
+    
+    def render_question(self, question):
+        """Return the contents of the standalone file for one question."""
+        self.xml_utils.process_xml_element_text(question)
+        return f'<?xml version="1.0" encoding="UTF-8"?>\n<quiz>{self._serialize_question(question)}</quiz>'
+    
+    def question_hash(self, question):
+        """Hash a question independently of CDATA, entity and fullwidth rewrites.
+        
+        Tails are included so changes to mixed-content text are detected;
+        the question's own tail lies outside it and is ignored.
+        """
+        digest = hashlib.sha256()
+        for elem in question.iter():
+            digest.update(elem.tag.encode('utf-8'))
+            for key, value in sorted(elem.attrib.items()):
+                digest.update(f"\x1f{key}={value}".encode('utf-8'))
+            text = self.text_processor.normalize_for_comparison(elem.text or '')
+            digest.update(f"\x1e{text}\x1d".encode('utf-8'))
+            if elem is not question:
+                tail = self.text_processor.normalize_for_comparison(elem.tail or '')
+                digest.update(f"\x1c{tail}\x1d".encode('utf-8'))
+        return digest.hexdigest()
+    
+    def export_to_structure(self, input_file, base_output_dir, resume=False):
+        """Export Moodle XML questions to directory structure.
+        
+        Completed questions are recorded in a checkpoint journal inside
+        `base_output_dir`; with `resume` an interrupted export continues
+        after the last recorded question.
+        """
+        print(f"Exporting Moodle XML from: {input_file}")
+        print(f"Output directory: {base_output_dir}")
+        
+        question_count = 0
+        skipped_count = 0
+        filename_registry = FilenameRegistry()
+        journal = None
+        
+        try:
+            header = {'operation': 'export', 'format': self.EXTENSION, **CheckpointJournal.describe_input(input_file)}
+        except OSError as e:
+            self._report_read_error(input_file, e)
+            return False
+        
+        try:
+            journal, records = CheckpointJournal.open(
+                os.path.join(base_output_dir, EXPORT_JOURNAL), self.file_handler, header, resume)
+            if records is None:
+                return False
+            completed = {record['index'] for record in records}
             
-            try:
-                quiz_root = ET.Element('quiz')
-                self.xml_utils.process_xml_element_text(question)
-                quiz_root.append(question)
-                
-                xml_string = ET.tostring(quiz_root, encoding='unicode', method='xml')
-                xml_string = self.xml_utils.ensure_text_elements_complete(xml_string)
-                xml_final = f'<?xml version="1.0" encoding="UTF-8"?>\n{xml_string}'
-                
-                with open(output_filepath, 'w', encoding='utf-8') as f:
-                    f.write(xml_final)
+            questions = guard_input(self.iter_questions(input_file), (ET.ParseError, *READ_ERRORS))
+            for index, (category_path, question_name, question) in enumerate(questions):
+                if index in completed:
+                    self.question_path(base_output_dir, category_path, question_name, filename_registry)
+                    skipped_count += 1
+                    continue
                 
-                print(f"  Created: {os.path.relpath(output_filepath, base_output_dir)}")
-                question_count += 1
-            except IOError as e:
-                print(f"  Error writing {output_filepath}: {e}", file=sys.stderr)
+                output_filepath = self.write_question(base_output_dir, category_path, question_name,
+                                                      question, filename_registry)
+                if output_filepath:
+                    rel_path = os.path.relpath(output_filepath, base_output_dir)
+                    journal.record({'index': index, 'path': rel_path})
+                    print(f"  Created: {rel_path}")
+                    question_count += 1
+        except InputError as e:
+            journal.close()
+            self._report_read_error(input_file, e.error)
+            if question_count:
+                print(f"Note: {question_count} questions read before the error were kept in '{base_output_dir}'.",
+                      file=sys.stderr)
+            return False
+        except OSError as e:
+            if journal is not None:
+                journal.close()
+            print(f"Error: Could not write to output directory '{base_output_dir}': {e}", file=sys.stderr)
+            return False
         
-        print(f"\n✓ Export completed: {question_count} questions")
+        journal.finish()
+        if skipped_count:
+            print(f"\n✓ Export completed: {question_count} questions ({skipped_count} already done)")
+        else:
+            print(f"\n✓ Export completed: {question_count} questions")
         return True
     
-    def collect_from_structure(self, base_input_dir, output_file):
-        """Collect Moodle XML questions from directory structure."""
+    def collect_from_structure(self, base_input_dir, output_file, max_size=None, max_questions=None, resume=False,
+                               markdown=None, jobs=None):
+        """Collect Moodle XML questions from directory structure.
+        
+        With `max_size` (bytes) or `max_questions` the output is split into
+        numbered shards, each a complete <quiz> starting with its category.
+        With a `markdown` converter, Markdown question text is converted to
+        HTML; `jobs` > 1 parses and converts files in worker processes.
+        """
         print(f"Collecting Moodle XML from: {base_input_dir}")
         print(f"Output file: {output_file}")
         
@@ -119,49 +220,132 @@ class MoodleXMLProcessor:
         
         xml_files.sort()
         
-        quiz_root = ET.Element('quiz')
+        return self.collect_files([(rel_path, filepath, filepath) for rel_path, filepath in xml_files],
+                                  output_file, max_size, max_questions, resume, markdown, jobs)
+    
+    def collect_files(self, xml_files, output_file, max_size=None, max_questions=None, resume=False,
+                      markdown=None, jobs=None):
+        """Write (rel_path, filepath, source_label) entries, sorted by rel_path, to `output_file`.
+        
+        The category of each question comes from the directory of its rel_path.
+        Progress is journaled next to the output; with `resume` an interrupted
+        collection continues after the last recorded file.
+        """
+        header = '<?xml version="1.0" encoding="UTF-8"?>\n<quiz>'
+        footer = '</quiz>'
         current_category = None
         question_count = 0
+        journal = None
         
-        for rel_path, filepath in xml_files:
-            dir_path = os.path.dirname(rel_path)
-            
-            if dir_path != current_category:
-                current_category = dir_path
-                category_elem = ET.SubElement(quiz_root, 'question', type='category')
-                category_text = ET.SubElement(ET.SubElement(category_elem, 'category'), 'text')
-                
-                if dir_path:
-                    category_path = '$course$/' + dir_path.replace(os.sep, '/')
-                else:
-                    category_path = '$course$'
-                
-                category_text.text = category_path
-            
-            try:
-                tree = ET.parse(filepath)
-                question_root = tree.getroot()
-                
-                for question in question_root.findall('question'):
-                    self.xml_utils.process_xml_element_text(question)
-                    quiz_root.append(question)
-                    question_count += 1
-                    print(f"  Added: {rel_path}")
-            except ET.ParseError as e:
-                print(f"  Error parsing {filepath}: {e}", file=sys.stderr)
-            except Exception as e:
-                print(f"  Error reading {filepath}: {e}", file=sys.stderr)
-        
-        xml_string = ET.tostring(quiz_root, encoding='unicode', method='xml')
-        xml_string = self.xml_utils.ensure_text_elements_complete(xml_string)
-        xml_final = f'<?xml version="1.0" encoding="UTF-8"?>\n{xml_string}'
+        if resume and self.file_handler.is_compressed(output_file):
+            print(f"Error: --resume is not supported for compressed output '{output_file}'.", file=sys.stderr)
+            return False
         
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(xml_final)
+            journal, records = CheckpointJournal.open(
+                output_file + COLLECT_JOURNAL_SUFFIX, self.file_handler,
+                CheckpointJournal.describe_listing(self.EXTENSION, output_file, xml_files, max_size, max_questions,
+                                                   markdown),
+                resume)
+            if records is None:
+                return False
+            completed = {record['file'] for record in records}
+            
+            with ShardWriter(self.file_handler, output_file, header, footer, max_size, max_questions) as out:
+                if records:
+                    out.restore(records[-1]['writer'])
+                    current_category = os.path.dirname(records[-1]['file'])
+                    question_count = records[-1]['questions']
+                
+                pending = [entry for entry in xml_files if entry[0] not in completed]
+                for rel_path, chunks in iter_rendered_entries(self, pending, markdown, jobs):
+                    dir_path = os.path.dirname(rel_path)
+                    
+                    if dir_path != current_category:
+                        current_category = dir_path
+                        category_elem = ET.Element('question', type='category')
+                        category_text = ET.SubElement(ET.SubElement(category_elem, 'category'), 'text')
+                        
+                        if dir_path:
+                            category_path = '$course$/' + dir_path.replace(os.sep, '/')
+                        else:
+                            category_path = '$course$'
+                        
+                        category_text.text = category_path
+                        out.set_category(self._serialize_question(category_elem))
+                    
+                    for chunk in chunks or ():
+                        out.write_question(chunk)
+                        question_count += 1
+                        print(f"  Added: {rel_path}")
+                    
+                    if out.is_open and out.resumable:
+                        journal.record({'file': rel_path, 'questions': question_count, 'writer': out.checkpoint()})
             
-            print(f"\n✓ Collection completed: {question_count} questions in {output_file}")
+            if markdown is not None:
+                markdown.save()
+            journal.finish()
+            if out.sharded:
+                print(f"\n✓ Collection completed: {question_count} questions in {len(out.shard_paths)} shards")
+                for shard_path in out.shard_paths:
+                    print(f"  Shard: {shard_path}")
+            else:
+                print(f"\n✓ Collection completed: {question_count} questions in {output_file}")
             return True
         except IOError as e:
+            if journal is not None:
+                journal.close()
             print(f"Error writing output file {output_file}: {e}", file=sys.stderr)
             return False
+    
+    def render_collect_entry(self, filepath, source_label, markdown=None):
+        """Return the serialized questions of one collected file, or None if it cannot be read."""
+        try:
+            tree = ET.parse(filepath)
+            question_root = tree.getroot()
+        except ET.ParseError as e:
+            print(f"  Error parsing {filepath}: {e}", file=sys.stderr)
+            return None
+        except Exception as e:
+            print(f"  Error reading {filepath}: {e}", file=sys.stderr)
+            return None
+        
+        chunks = []
+        for question in question_root.findall('question'):
+            self.xml_utils.process_xml_element_text(question)
+            chunk = self._serialize_question(question)
+            if markdown is not None:
+                chunk = self.convert_markdown(chunk, markdown)
+            chunks.append(chunk)
+        return chunks
+    
+    def convert_markdown(self, chunk, markdown):
+        """Convert the Markdown <questiontext> of one serialized question to HTML.
+        
+        Only `markdown`, `moodle_auto_format` or unformatted text is
+        converted, like the GIFT format markers. Conversion runs on the
+        serialized CDATA so the generated tags are not turned into fullwidth
+        characters like the rest of the text.
+        """
+        match = self.QUESTION_TEXT.search(chunk)
+        if not match:
+            return chunk
+        format_match = self.TEXT_FORMAT.search(match.group('open'))
+        if format_match and format_match.group(1) not in self.MARKDOWN_FORMATS:
+            return chunk
+        converted = markdown.convert(match.group('text'))
+        if converted is None:
+            return chunk
+        
+        open_tag = match.group('open')
+        if format_match:
+            open_tag = self.TEXT_FORMAT.sub('format="html"', open_tag)
+        else:
+            open_tag = open_tag[:-1] + ' format="html">'
+        return (f"{chunk[:match.start()]}{open_tag}{match.group('text_open')}"
+                f"<![CDATA[{converted}]]>{chunk[match.end():]}")
+    
+    def _serialize_question(self, question):
+        """Serialize one <question> element as it appears inside <quiz>."""
+        xml_string = ET.tostring(question, encoding='unicode', method='xml')
+        return self.xml_utils.ensure_text_elements_complete(xml_string)
@@ -1,9 +1,12 @@
 """XML processing utilities for Moodle XML format."""
 
+import codecs
 import re
 import sys
 import xml.etree.ElementTree as ET
 
+from .file_utils import FileHandler
+
 
 class XMLProcessor:
     """Handles XML-specific processing operations."""
@@ -11,48 +14,95 @@ class XMLProcessor:
     def __init__(self, text_processor):
         self.text_processor = text_processor
     
+    CHUNK_SIZE = 1024 * 1024
+    
+    INVALID_XML_CHARS = re.compile('[^\x09\x0A\x0D\x20-\uD7FF\uE000-\uFFFD]')
+    
+    def iter_cleaned_chunks(self, input_file):
+        """Read an XML file in chunks, decoding it and replacing invalid XML characters.
+        
+        gzip, bz2 and xz files are decompressed as they are read.
+        """
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        encoding = 'utf-8'
+        null_warned = False
+        invalid_count = 0
+        
+        with FileHandler.open_binary(input_file) as f:
+            while True:
+                data = f.read(self.CHUNK_SIZE)
+                final = not data
+                
+                if b'\x00' in data:
+                    if not null_warned:
+                        print("  ⚠ Warning: File contains null bytes (0x00), cleaning...", file=sys.stderr)
+                        null_warned = True
+                    data = data.replace(b'\x00', b' ')
+                
+                if encoding == 'utf-8':
+                    pending = decoder.getstate()[0]
+                    try:
+                        text = decoder.decode(data, final)
+                    except UnicodeDecodeError:
+                        print("  ⚠ Warning: File is not UTF-8, using latin-1", file=sys.stderr)
+                        encoding = 'latin-1'
+                        text = (pending + data).decode('latin-1')
+                else:
+                    text = data.decode('latin-1')
+                
+                text, count = self.INVALID_XML_CHARS.subn(' ', text)
+                invalid_count += count
+                if text:
+                    yield text
+                if final:
+                    break
+        
+        if invalid_count > 0:
+            print(f"  ⚠ Warning: Cleaned {invalid_count} invalid XML characters", file=sys.stderr)
+    
     def preprocess_xml_file(self, input_file):
         """Pre-process XML file to clean invalid characters before parsing."""
         try:
-            with open(input_file, 'rb') as f:
-                content = f.read()
-            
-            if b'\x00' in content:
-                print("  ⚠ Warning: File contains null bytes (0x00), cleaning...", file=sys.stderr)
-                content = content.replace(b'\x00', b' ')
-            
-            try:
-                xml_string = content.decode('utf-8')
-            except UnicodeDecodeError:
-                try:
-                    xml_string = content.decode('latin-1')
-                    print("  ⚠ Warning: File is not UTF-8, using latin-1", file=sys.stderr)
-                except:
-                    print("  ✗ Error: Could not decode file", file=sys.stderr)
-                    return None
-            
-            cleaned_chars = []
-            invalid_count = 0
-            
-            for char in xml_string:
-                code = ord(char)
-                if (code == 0x09 or code == 0x0A or code == 0x0D or 
-                    (code >= 0x20 and code <= 0xD7FF) or
-                    (code >= 0xE000 and code <= 0xFFFD)):
-                    cleaned_chars.append(char)
-                else:
-                    cleaned_chars.append(' ')
-                    invalid_count += 1
-            
-            if invalid_count > 0:
-                print(f"  ⚠ Warning: Cleaned {invalid_count} invalid XML characters", file=sys.stderr)
-            
-            return ''.join(cleaned_chars)
-            
+            return ''.join(self.iter_cleaned_chunks(input_file))
         except Exception as e:
             print(f"  ✗ Error pre-processing XML: {e}", file=sys.stderr)
             return None
     
+    def iter_quiz_elements(self, input_file):
+        """Stream the top-level <question> elements of a Moodle XML file.
+        
+        Each element is yielded once its tail is known and detached from the
+        root afterwards, so memory stays bounded by the largest question.
+        Raises ET.ParseError on malformed input.
+        """
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+        pending = None
+        depth = 0
+        
+        for chunk in self.iter_cleaned_chunks(input_file):
+            parser.feed(chunk)
+            for event, elem in parser.read_events():
+                if event == 'start':
+                    depth += 1
+                    if depth == 1:
+                        root = elem
+                    elif depth == 2 and pending is not None:
+                        yield pending
+                        root.remove(pending)
+                        pending = None
+                else:
+                    depth -= 1
+                    if depth == 1 and elem.tag == 'question':
+                        pending = elem
+                    elif depth == 1:
+                        root.remove(elem)
+                    elif depth == 0 and pending is not None:
+                        yield pending
+                        root.remove(pending)
+                        pending = None
+        parser.close()
+    
     def ensure_text_elements_complete(self, xml_string):
         """Ensure all <text/> elements are complete and content is in CDATA."""
         xml_string = re.sub(r'<text\s*/>', '<text></text>', xml_string)
@@ -1,5 +1,14 @@
 """Basic tests for reorganizer package."""
 
+import gzip
+import io
+import lzma
+import os
+import subprocess
+import sys
+import tarfile
+import xml.etree.ElementTree as ET
+
 import pytest
 from reorganizer import QuestionBackupReorganizer
 from reorganizer.text_utils import TextProcessor
@@ -70,5 +79,436 @@ def test_html_entity_to_fullwidth():
     assert "&lt;" not in result
 
 
+def test_collect_gift_shards_reemit_category(tmp_path):
+    """Test that sharded GIFT collect splits on questions and repeats categories."""
+    category_dir = tmp_path / "bank" / "Cat"
+    category_dir.mkdir(parents=True)
+    for i in range(3):
+        (category_dir / f"q{i}.gift").write_text(f"::Q{i}::Question {i} {{=yes ~no}}\n", encoding="utf-8")
+    
+    r = QuestionBackupReorganizer()
+    assert r.collect_gift_from_structure(str(tmp_path / "bank"), str(tmp_path / "out.gift"), max_questions=2)
+    
+    first = (tmp_path / "out_001.gift").read_text(encoding="utf-8")
+    second = (tmp_path / "out_002.gift").read_text(encoding="utf-8")
+    assert not (tmp_path / "out.gift").exists()
+    assert first.count("\n::Q") == 2 and second.count("\n::Q") == 1
+    assert "$CATEGORY: $course$/Cat" in first
+    assert "$CATEGORY: $course$/Cat" in second
+
+
+def test_diff_xml_banks_ignores_cdata_and_detects_moves(tmp_path):
+    """Test that the semantic diff classifies moved and modified questions."""
+    old = tmp_path / "old.xml"
+    new = tmp_path / "new.xml"
+    old.write_text(
+        '<quiz><question type="category"><category><text>$course$/A</text></category></question>'
+        '<question type="essay"><name><text>Q1</text></name><questiontext><text>1 &lt; 2</text></questiontext></question>'
+        '<question type="essay"><name><text>Q2</text></name><questiontext><text>same</text></questiontext></question>'
+        '<question type="essay"><name><text>Q3</text></name><questiontext><text>old</text></questiontext></question>'
+        '</quiz>', encoding="utf-8")
+    new.write_text(
+        '<quiz><question type="category"><category><text>$course$/A</text></category></question>'
+        '<question type="essay"><name><text>Q1</text></name><questiontext><text><![CDATA[1 ＜ 2]]></text></questiontext></question>'
+        '<question type="essay"><name><text>Q3</text></name><questiontext><text>new</text></questiontext></question>'
+        '<question type="category"><category><text>$course$/B</text></category></question>'
+        '<question type="essay"><name><text>Q2</text></name><questiontext><text>same</text></questiontext></question>'
+        '</quiz>', encoding="utf-8")
+    
+    r = QuestionBackupReorganizer()
+    old_index = r.differ.build_index(r.xml_processor, str(old))
+    new_index = r.differ.build_index(r.xml_processor, str(new))
+    added, removed, moved, modified = r.differ.compare(old_index, new_index)
+    
+    assert added == [] and removed == []
+    assert moved == [(("A", "Q2", 0), ("B", "Q2", 0))]
+    assert modified == [("A", "Q3", 0)]
+    
+    q = '<question type="essay"><name><text>Q</text></name><questiontext><text>a <b>x</b> {}</text></questiontext></question>'
+    hashes = [r.xml_processor.question_hash(ET.fromstring(q.format(tail))) for tail in ("old tail", "NEW TAIL")]
+    assert hashes[0] != hashes[1]
+
+
+def test_export_reports_output_errors_and_keeps_questions_before_parse_error(tmp_path, capsys):
+    """Test that export blames the output for write errors and keeps questions read before a parse error."""
+    bank = tmp_path / "bank.gift"
+    bank.write_text("// q.gift\n::Q::Question {=a ~b}\n", encoding="utf-8")
+    (tmp_path / "afile").write_text("", encoding="utf-8")
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    assert not r.export_gift_to_structure(str(bank), str(tmp_path / "afile" / "out"))
+    err = capsys.readouterr().err
+    assert "Could not write to output directory" in err and "Could not read file" not in err
+    
+    truncated = tmp_path / "truncated.xml"
+    truncated.write_text('<quiz><question type="essay"><name><text>Q1</text></name></question>'
+                         '<question type="essay"><name><text>Q2</te', encoding="utf-8")
+    assert not r.export_xml_to_structure(str(truncated), str(tmp_path / "tree"))
+    assert "1 questions read before the error were kept" in capsys.readouterr().err
+    assert (tmp_path / "tree" / "Q1.xml").exists()
+
+
+def test_export_many_gift_inputs_shares_filename_registry(tmp_path):
+    """Test that exporting several inputs never overwrites colliding names."""
+    for course in ("c1", "c2"):
+        (tmp_path / f"{course}.gift").write_text(
+            f"$CATEGORY: $course$/Shared\n\n// {course}.gift\n::Same::From {course} {{=a ~b}}\n",
+            encoding="utf-8")
+    
+    r = QuestionBackupReorganizer()
+    output = tmp_path / "out"
+    assert r.export_gift_files_to_structure([str(tmp_path / "*.gift")], str(output), jobs=1)
+    
+    assert "From c1" in (output / "Shared" / "Same.gift").read_text(encoding="utf-8")
+    assert "From c2" in (output / "Shared" / "Same_1.gift").read_text(encoding="utf-8")
+    assert sorted(p.name for p in output.iterdir()) == ["Shared"]
+    assert not list(tmp_path.glob(".reorganizer-staging-*"))
+    
+    literal = tmp_path / "course[1].gift"
+    literal.write_text("", encoding="utf-8")
+    assert r.multi_exporter.expand_inputs([str(literal)]) == [str(literal)]
+
+
+def test_snapshots_deduplicate_and_collect_from_store(tmp_path, monkeypatch):
+    """Test that snapshots share objects and can be collected without a tree."""
+    bank = tmp_path / "bank.gift"
+    bank.write_text("$CATEGORY: $course$/Cat\n\n// a.gift\n::Q1::One {=a ~b}\n\n"
+                    "// b.gift\n::Q2::Two {=a ~b}\n", encoding="utf-8")
+    store = tmp_path / "store"
+    
+    synced = []
+    real_sync_directory = FileHandler.sync_directory
+    monkeypatch.setattr(FileHandler, "sync_directory",
+                        lambda self, dirpath: synced.append(dirpath) or real_sync_directory(self, dirpath))
+    
+    r = QuestionBackupReorganizer()
+    assert r.snapshot_gift(str(bank), str(store), name="day1")
+    assert len(synced) == len(set(synced))
+    synced.clear()
+    assert r.restore_snapshot(str(store), "day1", str(tmp_path / "restored"))
+    assert synced == [str(tmp_path / "restored" / "Cat")]
+    bank.write_text(bank.read_text(encoding="utf-8").replace("Two", "Changed"), encoding="utf-8")
+    assert r.snapshot_gift(str(bank), str(store), name="day2")
+    
+    objects = [p for p in (store / "objects").rglob("*") if p.is_file()]
+    assert len(objects) == 3
+    
+    output = tmp_path / "day1.gift"
+    assert r.collect_gift_from_snapshot(str(store), "day1", str(output))
+    collected = output.read_text(encoding="utf-8")
+    assert "$CATEGORY: $course$/Cat" in collected
+    assert "Two" in collected and "Changed" not in collected
+    
+    for bad_name in ("x/y", "../escaped"):
+        assert not r.snapshot_gift(str(bank), str(store), name=bad_name)
+    assert not (tmp_path / "escaped.json").exists()
+
+
+def test_export_resume_continues_after_interruption(tmp_path):
+    """Test that --resume skips questions already recorded in the journal."""
+    bank = tmp_path / "bank.gift"
+    bank.write_text("".join(f"// q{i}.gift\n::Same::Question {i} {{=a ~b}}\n\n" for i in range(4)),
+                    encoding="utf-8")
+    output = tmp_path / "out"
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    original_write = r.gift_processor.write_question
+    calls = []
+    
+    def interrupted_write(*args):
+        calls.append(args)
+        if len(calls) == 3:
+            raise KeyboardInterrupt
+        return original_write(*args)
+    
+    r.gift_processor.write_question = interrupted_write
+    with pytest.raises(KeyboardInterrupt):
+        r.export_gift_to_structure(str(bank), str(output))
+    assert (output / ".reorganizer-journal").exists()
+    
+    r.gift_processor.write_question = original_write
+    assert r.export_gift_to_structure(str(bank), str(output), resume=True)
+    
+    assert not (output / ".reorganizer-journal").exists()
+    assert sorted(p.name for p in output.iterdir()) == ["Same.gift", "Same_1.gift", "Same_2.gift", "Same_3.gift"]
+    assert "Question 3" in (output / "Same_3.gift").read_text(encoding="utf-8")
+    assert not list(output.glob("*.partial"))
+
+
+def test_compressed_input_and_output_round_trip(tmp_path):
+    """Test that xz input is exported and gzip output is collected transparently."""
+    bank = tmp_path / "bank.xml.xz"
+    with lzma.open(bank, "wt", encoding="utf-8") as f:
+        f.write('<quiz><question type="category"><category><text>$course$/Cat</text></category></question>'
+                '<question type="essay"><name><text>Q1</text></name>'
+                '<questiontext><text>Hello</text></questiontext></question></quiz>')
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    assert r.export_xml_to_structure(str(bank), str(tmp_path / "tree"))
+    assert (tmp_path / "tree" / "Cat" / "Q1.xml").exists()
+    
+    output = tmp_path / "out.xml.gz"
+    assert r.collect_xml_from_structure(str(tmp_path / "tree"), str(output))
+    with gzip.open(output, "rt", encoding="utf-8") as f:
+        collected = f.read()
+    assert collected.startswith('<?xml version="1.0" encoding="UTF-8"?>')
+    assert "<![CDATA[Hello]]>" in collected
+
+
+def test_tree_files_are_read_without_sniffing_compression(tmp_path, monkeypatch):
+    """Test that only monolithic inputs are checked for compression magic bytes."""
+    bank = tmp_path / "bank.gift.gz"
+    with gzip.open(bank, "wt", encoding="utf-8") as f:
+        f.write("$CATEGORY: $course$/Cat\n\n::Q1::Hello {=a ~b}\n")
+    
+    sniffed = []
+    real_opener = FileHandler.compression_opener
+    monkeypatch.setattr(FileHandler, "compression_opener",
+                        staticmethod(lambda path: sniffed.append(path) or real_opener(path)))
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    assert r.export_gift_to_structure(str(bank), str(tmp_path / "tree"))
+    assert r.lint_gift([str(bank)])
+    assert sniffed == [str(bank), str(bank)]
+    
+    assert r.collect_gift_from_structure(str(tmp_path / "tree"), str(tmp_path / "out.gift"))
+    assert r.lint_gift([str(tmp_path / "tree")])
+    assert sniffed == [str(bank), str(bank)]
+    assert "Hello" in (tmp_path / "out.gift").read_text(encoding="utf-8")
+
+
+def test_collect_markdown_converts_question_text_and_caches(tmp_path, monkeypatch):
+    """Test that --markdown converts GIFT and XML question text and reuses the cache."""
+    (tmp_path / "g" / "Cat").mkdir(parents=True)
+    (tmp_path / "g" / "Cat" / "Q.gift").write_text(
+        "::Q::\nUse **bold**:\n\n```\nx = a * b\n\ny = 1\n```\n{=yes ~no}\n", encoding="utf-8")
+    (tmp_path / "x" / "Cat").mkdir(parents=True)
+    (tmp_path / "x" / "Cat" / "Q.xml").write_text(
+        '<quiz><question type="essay"><name><text>Q</text></name>'
+        '<questiontext format="markdown"><text>Is `x` **set**?</text></questiontext></question></quiz>',
+        encoding="utf-8")
+    cache = tmp_path / "cache.json"
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    assert r.collect_gift_from_structure(str(tmp_path / "g"), str(tmp_path / "o.gift"),
+                                         markdown=True, markdown_cache=str(cache))
+    gift = (tmp_path / "o.gift").read_text(encoding="utf-8")
+    assert "::Q::\n[html]<p>Use <strong>bold</strong>:</p>\n<pre><code>x = a * b\n&nbsp;\ny = 1</code></pre>\n{=yes ~no}" in gift
+    
+    assert r.collect_xml_from_structure(str(tmp_path / "x"), str(tmp_path / "o.xml"),
+                                        markdown=True, markdown_cache=str(cache))
+    assert ('<questiontext format="html"><text><![CDATA[<p>Is <code>x</code> <strong>set</strong>?</p>]]>'
+            in (tmp_path / "o.xml").read_text(encoding="utf-8"))
+    
+    def fail(text):
+        raise AssertionError("conversion should come from the cache")
+    
+    monkeypatch.setattr("reorganizer.markdown_to_html.convert_markdown_to_html", fail)
+    assert r.collect_gift_from_structure(str(tmp_path / "g"), str(tmp_path / "o2.gift"),
+                                         markdown=True, markdown_cache=str(cache))
+    assert (tmp_path / "o2.gift").read_text(encoding="utf-8") == gift
+
+
+def test_collect_markdown_leaves_html_question_text_alone(tmp_path):
+    """Test that --markdown only converts XML question text in a Markdown-compatible format."""
+    (tmp_path / "x" / "Cat").mkdir(parents=True)
+    (tmp_path / "x" / "Cat" / "Html.xml").write_text(
+        '<quiz><question type="essay"><name><text>Html</text></name>'
+        '<questiontext format="html"><text><![CDATA[<p>a **b**</p>]]></text></questiontext></question></quiz>',
+        encoding="utf-8")
+    (tmp_path / "x" / "Cat" / "Auto.xml").write_text(
+        '<quiz><question type="essay"><name><text>Auto</text></name>'
+        '<questiontext format="moodle_auto_format"><text>a **b**</text></questiontext></question></quiz>',
+        encoding="utf-8")
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    assert r.collect_xml_from_structure(str(tmp_path / "x"), str(tmp_path / "o.xml"),
+                                        markdown=True, markdown_cache=str(tmp_path / "cache.json"))
+    content = (tmp_path / "o.xml").read_text(encoding="utf-8")
+    assert "<strong>" not in content.split("<name><text><![CDATA[Html]]>")[1]
+    assert '<questiontext format="html"><text><![CDATA[<p>a <strong>b</strong></p>]]>' in content
+
+
+def test_collect_resume_rejects_markdown_mismatch(tmp_path, capsys):
+    """Test that an interrupted --markdown collect cannot be resumed without --markdown."""
+    for i in range(3):
+        (tmp_path / "g" / "Cat").mkdir(parents=True, exist_ok=True)
+        (tmp_path / "g" / "Cat" / f"Q{i}.gift").write_text(f"::Q{i}::Use **bold** {{=a ~b}}\n", encoding="utf-8")
+    output = tmp_path / "o.gift"
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    original_render = r.gift_processor.render_collect_entry
+    calls = []
+    
+    def interrupted_render(*args):
+        calls.append(args)
+        if len(calls) == 2:
+            raise KeyboardInterrupt
+        return original_render(*args)
+    
+    r.gift_processor.render_collect_entry = interrupted_render
+    with pytest.raises(KeyboardInterrupt):
+        r.collect_gift_from_structure(str(tmp_path / "g"), str(output), markdown=True,
+                                      markdown_cache=str(tmp_path / "cache.json"))
+    r.gift_processor.render_collect_entry = original_render
+    
+    assert not r.collect_gift_from_structure(str(tmp_path / "g"), str(output), resume=True)
+    assert "belongs to a different run" in capsys.readouterr().err
+    assert r.collect_gift_from_structure(str(tmp_path / "g"), str(output), resume=True, markdown=True,
+                                         markdown_cache=str(tmp_path / "cache.json"))
+    assert output.read_text(encoding="utf-8").count("[html]") == 3
+
+
+def test_lint_reports_file_line_and_column(tmp_path, capsys):
+    """Test that lint reports GIFT and XML problems with their positions."""
+    bank = tmp_path / "bank.gift"
+    bank.write_text("$CATEGORY: $course$/A/\n\n::Ok::Fine {=a~b}\n\n::Bad::Open {=a ~b\n\n"
+                    "::Cloze::The {capital} of {=France}.\n", encoding="utf-8")
+    (tmp_path / "tree").mkdir()
+    (tmp_path / "tree" / "Q.xml").write_text(
+        '<quiz>\n<question type="cloze"><questiontext><text>A {1:FOO:=x}</text></questiontext></question>\n'
+        '<question type="essay"><name><text>B\x01</text></name></question>\n</quiz>\n', encoding="utf-8")
+    
+    r = QuestionBackupReorganizer(fsync=False)
+    assert not r.lint_gift([str(bank)])
+    assert not r.lint_xml([str(tmp_path / "tree")])
+    output = capsys.readouterr().out
+    assert f"{bank}:1:1: empty category name in '$course$/A/'" in output
+    assert f"{bank}:5:13: unclosed '{{' (missing '}}')" in output
+    assert f"{bank}:7:14: answer block does not start with '=', '~' or '#'" in output
+    assert "Q.xml:2:46: unknown cloze answer type 'FOO'" in output
+    assert "Q.xml:3:37: invalid XML character U+0001" in output
+    
+    (tmp_path / "ok.gift").write_text("::Essay::Explain. {}\n", encoding="utf-8")
+    assert r.export_gift_to_structure(str(tmp_path / "ok.gift"), str(tmp_path / "out"))
+    assert r.lint_gift([str(tmp_path / "out")])
+
+
+def test_batch_runs_gift_jobs_without_loading_xml(tmp_path):
+    """Test that batch runs export and collect jobs in one process and GIFT jobs skip XML imports."""
+    (tmp_path / "bank.gift").write_text("$CATEGORY: $course$/Cat\n\n::Q1::Hello {=a ~b}\n", encoding="utf-8")
+    jobs = tmp_path / "jobs.txt"
+    jobs.write_text("# rebuild\n"
+                    f"export gift {tmp_path / 'bank.gift'} -o {tmp_path / 'tree'}\n"
+                    f"collect gift {tmp_path / 'tree'} -o {tmp_path / 'out.gift'}\n", encoding="utf-8")
+    
+    script = ("import sys\n"
+              "from reorganizer.cli import main\n"
+              "try:\n"
+              f"    main(['--fsync', 'never', 'batch', {str(jobs)!r}])\n"
+              "except SystemExit as e:\n"
+              "    print('exit', e.code, 'xml.etree' in sys.modules)\n")
+    src = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True,
+                            env=dict(os.environ, PYTHONPATH=src))
+    
+    assert result.stdout.splitlines()[-1] == "exit 0 False"
+    assert "[2/2] collect gift" in result.stdout
+    assert "::Q1::" in (tmp_path / "out.gift").read_text(encoding="utf-8")
+
+
+def write_backup(backup, questions):
+    """Write a minimal .mbz holding one course file and `questions` as questions.xml."""
+    with tarfile.open(backup, "w:gz") as tar:
+        for name, data in (("files/aa/course-file", b"\0" * 1024), ("questions.xml", questions)):
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return backup
+
+
+def moodle3_backup(tmp_path, questions):
+    """Write a Moodle 3 style backup: questions directly under their category, no bank entries."""
+    return write_backup(tmp_path / "course.mbz", (
+        '<?xml version="1.0" encoding="UTF-8"?><question_categories>'
+        '<question_category id="1"><name>top</name><contextlevel>50</contextlevel><parent>0</parent>'
+        '</question_category>'
+        '<question_category id="2"><name>Unit 1</name><contextlevel>50</contextlevel><parent>1</parent>'
+        f'<questions>{questions}</questions></question_category></question_categories>').encode("utf-8"))
+
+
+def test_export_xml_streams_questions_out_of_mbz_backup(tmp_path):
+    """Test that a .mbz backup is exported from its questions.xml, keeping only the latest version."""
+    def version(number, text):
+        return (f'<question_versions id="{number}"><version>{number}</version><questions>'
+                f'<question id="{number}"><parent>0</parent><name>Capital</name>'
+                f'<questiontext>{text}</questiontext><questiontextformat>1</questiontextformat>'
+                '<qtype>shortanswer</qtype><plugin_qtype_shortanswer_question><answers><answer id="1">'
+                '<answertext>Lima</answertext><fraction>1.0000000</fraction></answer></answers>'
+                '</plugin_qtype_shortanswer_question></question></questions></question_versions>')
+    
+    questions = ('<?xml version="1.0" encoding="UTF-8"?><question_categories>'
+                 '<question_category id="2"><name>Unit 1</name><contextlevel>50</contextlevel><parent>1</parent>'
+                 '<question_bank_entries><question_bank_entry id="1"><question_version>'
+                 + version(1, "Old?") + version(2, "Capital of Peru?") +
+                 '</question_version></question_bank_entry></question_bank_entries></question_category>'
+                 '<question_category id="1"><name>top</name><contextlevel>50</contextlevel><parent>0</parent>'
+                 '</question_category></question_categories>').encode("utf-8")
+    
+    backup = write_backup(tmp_path / "course.mbz", questions)
+    reorganizer = QuestionBackupReorganizer(fsync=False)
+    assert reorganizer.export_xml_to_structure(str(backup), str(tmp_path / "tree"))
+    
+    exported = tmp_path / "tree" / "top" / "Unit_1" / "Capital.xml"
+    assert [p.name for p in (tmp_path / "tree").rglob("*.xml")] == ["Capital.xml"]
+    content = exported.read_text(encoding="utf-8")
+    assert "Capital of Peru?" in content and "Old?" not in content
+    assert '<answer fraction="100"' in content
+
+
+
+def test_export_xml_reads_moodle3_backup_and_drops_random_questions(tmp_path):
+    """Test that a backup without question_bank_entries is read and random questions are skipped."""
+    backup = moodle3_backup(tmp_path, (
+        '<question id="10"><parent>0</parent><name>Sky</name><questiontext>Sky colour?</questiontext>'
+        '<qtype>multichoice</qtype><plugin_qtype_multichoice_question><answers>'
+        '<answer id="1"><answertext>Blue</answertext><fraction>1.0000000</fraction></answer>'
+        '<answer id="2"><answertext>Red</answertext><fraction>0.0000000</fraction></answer></answers>'
+        '<multichoice id="1"><layout>0</layout><single>1</single><shuffleanswers>1</shuffleanswers></multichoice>'
+        '</plugin_qtype_multichoice_question></question>'
+        '<question id="11"><parent>0</parent><name>Random (Unit 1)</name><questiontext>0</questiontext>'
+        '<qtype>random</qtype></question>'))
+    
+    reorganizer = QuestionBackupReorganizer(fsync=False)
+    assert reorganizer.export_xml_to_structure(str(backup), str(tmp_path / "tree"))
+    
+    assert [p.name for p in (tmp_path / "tree").rglob("*.xml")] == ["Sky.xml"]
+    content = (tmp_path / "tree" / "top" / "Unit_1" / "Sky.xml").read_text(encoding="utf-8")
+    assert '<question type="multichoice">' in content
+    assert "<single>true</single>" in content and "<shuffleanswers>true</shuffleanswers>" in content
+    assert '<answer fraction="100"' in content and '<answer fraction="0"' in content
+
+
+def test_export_xml_folds_cloze_subquestions_from_backup(tmp_path):
+    """Test that {#N} markers become embedded answers, even when subquestions follow their parent."""
+    def subquestion(question_id, qtype, mark, plugin):
+        return (f'<question id="{question_id}"><parent>20</parent><name>sub</name><questiontext>{{#1}}</questiontext>'
+                f'<qtype>{qtype}</qtype><defaultmark>{mark}</defaultmark>'
+                f'<plugin_qtype_{qtype}_question>{plugin}</plugin_qtype_{qtype}_question></question>')
+    
+    backup = moodle3_backup(tmp_path, (
+        '<question id="20"><parent>0</parent><name>Cloze</name>'
+        '<questiontext>Capital of Peru: {#1}. 2+2 = {#2}</questiontext><qtype>multianswer</qtype>'
+        '<plugin_qtype_multianswer_question><multianswer id="1"><question>20</question>'
+        '<sequence>21,22</sequence></multianswer></plugin_qtype_multianswer_question></question>'
+        + subquestion(21, 'shortanswer', '1.0000000',
+                      '<answers><answer id="1"><answertext>Lima</answertext><fraction>1.0000000</fraction>'
+                      '<feedback>Right}</feedback></answer></answers>'
+                      '<shortanswer id="1"><usecase>0</usecase></shortanswer>')
+        + subquestion(22, 'multichoice', '2.0000000',
+                      '<answers><answer id="2"><answertext>4</answertext><fraction>1.0000000</fraction></answer>'
+                      '<answer id="3"><answertext>5</answertext><fraction>0.0000000</fraction></answer></answers>'
+                      '<multichoice id="2"><layout>1</layout><single>1</single>'
+                      '<shuffleanswers>0</shuffleanswers></multichoice>')))
+    
+    reorganizer = QuestionBackupReorganizer(fsync=False)
+    assert reorganizer.export_xml_to_structure(str(backup), str(tmp_path / "tree"))
+    
+    assert [p.name for p in (tmp_path / "tree").rglob("*.xml")] == ["Cloze.xml"]
+    content = (tmp_path / "tree" / "top" / "Unit_1" / "Cloze.xml").read_text(encoding="utf-8")
+    assert '<question type="cloze">' in content
+    assert "Capital of Peru: {1:SHORTANSWER:%100%Lima#Right\\}}. 2+2 = {2:MULTICHOICE_V:%100%4~%0%5}" in content
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])